@@ -0,0 +1 @@
+# Path: benchmarks/__init__.py
\ No newline at end of file
@@ -0,0 +1,119 @@
+# Recall-vs-latency benchmark of the approximate search modes against exact
+# search: IVF for several nprobe values and int8 / PQ quantized codes.
+#
+#   python -m benchmarks.ann_benchmark --rows 200000 --nprobe 1,4,8,16,32
+#
+# Every mode searches the same synthetic, clustered unit vectors held in a
+# resident VectorIndex; recall@k is measured against the exact top-k.
+import argparse
+import time
+import numpy as np
+from bson import ObjectId
+from config.settings import settings
+from models.vector_index import VectorIndex, EMBEDDING_DIM
+from models.ann_index import IVFIndex
+from models.quantization import QuantizedCodes, ScalarQuantizer, ProductQuantizer
+
+
+def make_corpus(rows: int, clusters: int, rng) -> np.ndarray:
+    centers = rng.normal(size=(clusters, EMBEDDING_DIM)).astype(np.float32)
+    labels = rng.integers(0, clusters, size=rows)
+    noise = rng.normal(scale=0.6, size=(rows, EMBEDDING_DIM)).astype(np.float32)
+    return centers[labels] + noise
+
+
+def timed(index, blocks, queries, top_k: int, nprobe=None) -> tuple:
+    results, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        candidate_ids, candidate_scores = index.search_blocks(
+            blocks, query, top_k, nprobe=nprobe
+        )
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        results.append(set(ids[np.argsort(scores)[::-1][:top_k]].tolist()))
+        latencies.append((time.perf_counter() - start) * 1000)
+    return results, np.array(latencies)
+
+
+def report(mode: str, results, exact, latencies) -> None:
+    recall = np.mean([len(a & e) / len(e) for a, e in zip(results, exact) if e])
+    print(
+        f"{mode:<12}{recall:>10.3f}{np.percentile(latencies, 50):>10.2f}"
+        f"{np.percentile(latencies, 95):>10.2f}"
+    )
+
+
+# Train outside the timed loop and warm the per-block postings and codes
+def build(index, blocks, queries, top_k: int) -> float:
+    start = time.perf_counter()
+    index.search_blocks(blocks, queries[0], top_k)
+    return time.perf_counter() - start
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000)
+    parser.add_argument("--clusters", type=int, default=500)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--top-k", type=int, default=10)
+    parser.add_argument("--nlist", type=int, default=0)
+    parser.add_argument("--nprobe", default="1,2,4,8,16,32")
+    parser.add_argument("--quantization", default="int8,pq")
+    parser.add_argument("--pq-subspaces", type=int, default=settings.pq_subspaces)
+    parser.add_argument("--rerank-size", type=int, default=200)
+    parser.add_argument("--train-size", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+    settings.ivf_min_rows = settings.quantization_min_rows = 0
+    settings.quantization_rerank_size = args.rerank_size
+
+    rng = np.random.default_rng(0)
+    exact_index = VectorIndex()
+    corpus = make_corpus(args.rows, args.clusters, rng)
+    for start in range(0, args.rows, 50000):
+        batch = corpus[start : start + 50000]
+        exact_index.add([ObjectId() for _ in batch], batch)
+    queries = exact_index.normalize(make_corpus(args.queries, args.clusters, rng))
+    blocks = exact_index.blocks()
+
+    print(f"rows={args.rows} top_k={args.top_k}")
+    print(f"{'mode':<12}{'recall@k':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    exact, latencies = timed(exact_index, blocks, queries, args.top_k)
+    report("exact", exact, exact, latencies)
+
+    ivf_index = VectorIndex(
+        ann_index=IVFIndex(
+            nlist=args.nlist, train_size=args.train_size, iterations=args.iterations
+        )
+    )
+    build_seconds = build(ivf_index, blocks, queries, args.top_k)
+    for nprobe in [int(value) for value in args.nprobe.split(",") if value]:
+        results, latencies = timed(
+            ivf_index, blocks, queries, args.top_k, nprobe=nprobe
+        )
+        report(f"ivf/{nprobe}", results, exact, latencies)
+    print(
+        f"  ivf nlist={len(ivf_index.ann_index.centroids)} "
+        f"build={build_seconds:.1f}s"
+    )
+
+    for quantization in [value for value in args.quantization.split(",") if value]:
+        quantizer = (
+            ProductQuantizer(args.pq_subspaces, iterations=args.iterations)
+            if quantization == "pq"
+            else ScalarQuantizer()
+        )
+        quantized_index = VectorIndex(
+            quantized_codes=QuantizedCodes(quantizer, train_size=args.train_size)
+        )
+        build_seconds = build(quantized_index, blocks, queries, args.top_k)
+        results, latencies = timed(quantized_index, blocks, queries, args.top_k)
+        report(quantization, results, exact, latencies)
+        codes = quantized_index.quantized_codes.codes
+        code_bytes = sum(block_codes.nbytes for block_codes in codes.values())
+        print(
+            f"  {quantization} {code_bytes / args.rows:.0f} bytes/row "
+            f"({EMBEDDING_DIM * 4 * args.rows / code_bytes:.0f}x smaller) "
+            f"build={build_seconds:.1f}s"
+        )
@@ -0,0 +1,123 @@
+# Throughput and allocation benchmark of the span chunker against the
+# splitters it replaced: LangChain's CharacterTextSplitter (500 characters,
+# overlap 10) for files, and the " ".join(words[i:i + 500]) loop wrapped in
+# Document objects for scraped websites.
+#
+#   python -m benchmarks.chunker_benchmark --megabytes 8
+#
+# MB/s is the best of --repeat runs. Peak KB/MB is the tracemalloc peak while
+# chunking one MB of text, and objects/MB the allocated blocks still held by
+# the result (the strings, lists and Documents a caller gets back).
+import argparse
+import gc
+import logging
+import random
+import sys
+import time
+import tracemalloc
+from models.chunker import iter_spans, split_text
+
+WORDS = (
+    "the retrieval model ranks every chunk of the corpus against the query "
+    "and packs the best of them into the prompt of the answering model while "
+    "pages are parsed embedded and written in batches"
+).split()
+
+
+# Paragraphs of sentences of random words, like extracted document text
+def sample_text(megabytes: float, seed: int = 0) -> str:
+    rng = random.Random(seed)
+    paragraphs, size = [], 0
+    while size < megabytes * 1_000_000:
+        sentences = [
+            " ".join(rng.choices(WORDS, k=rng.randint(6, 24))).capitalize() + "."
+            for _ in range(rng.randint(2, 8))
+        ]
+        paragraphs.append(" ".join(sentences))
+        size += len(paragraphs[-1]) + 2
+    return "\n\n".join(paragraphs)
+
+
+def spans_only(text: str):
+    return sum(1 for _ in iter_spans(text, 500, 10, sentences=True))
+
+
+def span_chunks(text: str):
+    return split_text(text, 500, 10, sentences=True)
+
+
+def span_token_chunks(text: str):
+    return split_text(text, 500, tokens=True)
+
+
+def character_splitter(text: str):
+    from langchain_text_splitters import CharacterTextSplitter
+
+    # It logs a warning for every paragraph longer than a chunk
+    logging.getLogger("langchain_text_splitters").setLevel(logging.ERROR)
+    return CharacterTextSplitter(chunk_size=500, chunk_overlap=10).create_documents(
+        [text]
+    )
+
+
+def word_loop(text: str):
+    from langchain_core.documents import Document
+
+    words = text.split()
+    chunks = [" ".join(words[i : i + 500]) for i in range(0, len(words), 500)]
+    return [Document(page_content=chunk) for chunk in chunks]
+
+
+CHUNKERS = (
+    ("spans", spans_only),
+    ("span chunks", span_chunks),
+    ("span tokens", span_token_chunks),
+    ("langchain", character_splitter),
+    ("word loop", word_loop),
+)
+
+
+def throughput(chunker, text: str, repeat: int) -> tuple:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = chunker(text)
+        best = min(best, time.perf_counter() - started)
+    chunks = result if isinstance(result, int) else len(result)
+    return chunks, len(text) / 1_000_000 / best
+
+
+def allocations(chunker, text: str) -> tuple:
+    megabytes = len(text) / 1_000_000
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    result = chunker(text)
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    gc.collect()
+    held = sys.getallocatedblocks() - blocks
+    del result
+    return peak / 1024 / megabytes, held / megabytes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--megabytes", type=float, default=8.0)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    text = sample_text(args.megabytes)
+    one_megabyte = text[:1_000_000]
+    print(f"{len(text) / 1_000_000:.1f} MB of text")
+    print(
+        f"{'chunker':<14}{'chunks':>8}{'MB/s':>10}{'peak KB/MB':>12}{'objects/MB':>12}"
+    )
+    for name, chunker in CHUNKERS:
+        try:
+            chunks, rate = throughput(chunker, text, args.repeat)
+        except ImportError as e:
+            print(f"{name:<14}skipped ({e.name} is not installed)")
+            continue
+        peak, held = allocations(chunker, one_megabyte)
+        print(f"{name:<14}{chunks:>8}{rate:>10.1f}{peak:>12.0f}{held:>12.0f}")
@@ -0,0 +1,143 @@
+# Pages-per-second benchmark and smoke test of the async website crawler
+# against the sequential scraping it replaced (one blocking request per page),
+# both crawling a stand-in website served by http.server on localhost.
+#
+#   python -m benchmarks.crawler_benchmark --pages 60 --latency-ms 50
+#
+# Every page answers after --latency-ms, like a remote site would. The crawl
+# is checked to return every page's text once, in link order, like the
+# sequential loop does.
+import argparse
+import asyncio
+import threading
+import time
+import requests
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from config.settings import settings
+from models.web_crawler import WebCrawler, parse_html
+
+
+def page_text(number: int) -> str:
+    return f"Page {number} " + " ".join(f"word{number}x{i}" for i in range(200))
+
+
+# Website of `pages` pages linked from its landing page, plus one external link
+# and one link to a missing page
+def site_handler(pages: int, latency: float, broken_link: bool):
+    links = [f'<a href="/page/{number}">{number}</a>' for number in range(pages)]
+    links.append('<a href="https://example.com/">elsewhere</a>')
+    if broken_link:
+        links.append('<a href="/page/missing">missing</a>')
+    landing = f"<html><body>{''.join(links)}</body></html>".encode()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+        # Buffer each response into one write so keep-alive connections do not
+        # stall on Nagle's algorithm and delayed ACKs
+        wbufsize = -1
+
+        def do_GET(self):
+            time.sleep(latency)
+            if self.path == "/":
+                body = landing
+            elif self.path.startswith("/page/") and self.path[6:].isdigit():
+                body = (
+                    f"<html><body><p>{page_text(int(self.path[6:]))}</p></body></html>"
+                )
+                body = body.encode()
+            else:
+                self.send_error(404)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+            self.wfile.flush()
+
+        def log_message(self, *args):
+            pass
+
+    return Handler
+
+
+# The default listen backlog of 5 drops connection bursts, which then wait
+# out a SYN retransmit
+class SiteServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+def serve(pages: int, latency: float, broken_link: bool) -> ThreadingHTTPServer:
+    server = SiteServer(("127.0.0.1", 0), site_handler(pages, latency, broken_link))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# The scraping before the crawler: the landing page, then each linked page of
+# the same site, one blocking request after the other
+def sequential(url: str, pages: int) -> float:
+    started = time.perf_counter()
+    crawled = []
+    with requests.Session() as session:
+        _, links = parse_html(session.get(url).text, url)
+        for page_url in links:
+            if page_url.startswith(url):
+                response = session.get(page_url)
+                response.raise_for_status()
+                crawled.append((page_url, parse_html(response.text, page_url)[0]))
+    seconds = time.perf_counter() - started
+    expected = [(f"{url}page/{number}", page_text(number)) for number in range(pages)]
+    assert crawled == expected, "scraped pages differ from the website's pages"
+    return seconds
+
+
+async def crawl(url: str, pages: int, per_host: int) -> float:
+    web_crawler = WebCrawler(
+        connections=100,
+        per_host=per_host,
+        pages_in_flight=settings.crawl_pages_in_flight,
+        timeout_seconds=settings.crawl_timeout_seconds,
+        connect_timeout_seconds=settings.crawl_connect_timeout_seconds,
+        max_page_bytes=settings.crawl_max_page_bytes,
+        max_urls=settings.crawl_max_urls,
+    )
+    try:
+        started = time.perf_counter()
+        crawled = [page async for page in web_crawler.crawl(url)]
+        seconds = time.perf_counter() - started
+    finally:
+        await web_crawler.close()
+    expected = [(f"{url}page/{number}", page_text(number)) for number in range(pages)]
+    assert crawled == expected, "crawled pages differ from the website's pages"
+    return seconds
+
+
+def report(mode: str, pages: int, seconds: float, baseline: float = None) -> None:
+    speedup = f"{baseline / seconds:>9.1f}x" if baseline else ""
+    print(f"{mode:<14}{pages:>6}{seconds:>10.2f}{pages / seconds:>12.1f}{speedup}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=60)
+    parser.add_argument("--latency-ms", type=float, default=50.0)
+    parser.add_argument("--per-host", type=int, nargs="+", default=[1, 4, 8, 16])
+    args = parser.parse_args()
+
+    server = serve(args.pages, args.latency_ms / 1000, broken_link=False)
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    print(f"{'mode':<14}{'pages':>6}{'seconds':>10}{'pages/s':>12}{'speedup':>10}")
+    baseline = sequential(url, args.pages)
+    report("sequential", args.pages, baseline)
+    for per_host in args.per_host:
+        seconds = asyncio.run(crawl(url, args.pages, per_host))
+        report(f"crawl x{per_host}", args.pages, seconds, baseline)
+    server.shutdown()
+
+    # A broken link is skipped by the crawler instead of failing the crawl
+    server = serve(args.pages, 0, broken_link=True)
+    url = f"http://127.0.0.1:{server.server_address[1]}/"
+    asyncio.run(crawl(url, args.pages, max(args.per_host)))
+    server.shutdown()
+    print("smoke test passed")
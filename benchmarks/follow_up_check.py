@@ -0,0 +1,128 @@
+# Smoke test of follow-up context reuse with the configured sentence-transformer:
+# short follow-ups the prompt invites ("explain more") must reuse the latest
+# turn's context, a follow-up about an earlier topic that turn's context, an
+# unrelated question no context, and turns answered without context must
+# never be picked.
+#
+#   python -m benchmarks.follow_up_check
+import asyncio
+import numpy as np
+from bson import ObjectId
+from config.settings import settings
+from models.conversation_memory import (
+    follow_up_score,
+    follow_up_turn,
+    recent_session_turns,
+)
+from models.embedding_codec import encode_embedding
+from models.embedding_models import embedding_models
+from models.history_writer import history_writer
+
+SESSION = "follow-up-check"
+# (query, answer, context ids), oldest first
+TURNS = [
+    (
+        "What is the refund policy for annual plans?",
+        "Annual plans can be refunded in full within 30 days of purchase.",
+        ["refunds"],
+    ),
+    (
+        "How do I reset my account password?",
+        "Open Settings, choose Security and click Reset password to get an email.",
+        ["passwords"],
+    ),
+]
+SHORT_FOLLOW_UPS = [
+    "explain more",
+    "explain pointwise",
+    "explain in 50 words",
+    "tell me more",
+    "why?",
+    "give an example",
+]
+EARLIER_TOPIC = "and how long do I have to ask for a refund on annual plans?"
+UNRELATED = "Who painted the Mona Lisa?"
+
+
+class Cursor:
+    def __init__(self, documents):
+        self.documents = documents
+
+    async def to_list(self, length=None):
+        return self.documents[:length]
+
+
+# RAG_History stand-in answering the query recent_session_turns sends
+class HistoryCollection:
+    def __init__(self, documents):
+        self.documents = documents
+
+    def find(self, query, projection=None, sort=None, limit=0):
+        matches = [
+            document
+            for document in reversed(self.documents)
+            if document["session_id"] == query["session_id"] and document["context_ids"]
+        ]
+        return Cursor(matches[:limit] if limit else matches)
+
+
+def embed(texts: list) -> list:
+    model = embedding_models.get()
+    return [
+        np.asarray(vector, dtype=np.float32) for vector in model.embed_documents(texts)
+    ]
+
+
+def history_documents() -> list:
+    queries = embed([query for query, _, _ in TURNS])
+    answers = embed([answer for _, answer, _ in TURNS])
+    return [
+        {
+            "_id": ObjectId(),
+            "session_id": SESSION,
+            "context_ids": context_ids,
+            "query_embedding": encode_embedding(query),
+            "response_embedding": encode_embedding(answer),
+        }
+        for (_, _, context_ids), query, answer in zip(TURNS, queries, answers)
+    ]
+
+
+async def main() -> None:
+    documents = history_documents()
+    # A greeting answered without context, still buffered by the history writer
+    history_writer.unflushed[SESSION] = {
+        "session_id": SESSION,
+        "context_ids": [],
+        "query_embedding": encode_embedding(embed(["thanks!"])[0]),
+    }
+    turns = await recent_session_turns(
+        HistoryCollection(documents), SESSION, settings.follow_up_turns
+    )
+    assert [turn["context_ids"] for turn in turns] == [["passwords"], ["refunds"]]
+
+    thresholds = settings.follow_up_threshold, settings.follow_up_bare_threshold
+    for query, embedding in zip(SHORT_FOLLOW_UPS, embed(SHORT_FOLLOW_UPS)):
+        turn = follow_up_turn(turns, query, embedding, *thresholds)
+        score = follow_up_score(turns[0], embedding)
+        print(f"{query!r:<26} similarity to the latest turn {score:.2f}")
+        assert turn is not None and turn["context_ids"] == ["passwords"], query
+
+    (embedding,) = embed([EARLIER_TOPIC])
+    turn = follow_up_turn(turns, EARLIER_TOPIC, embedding, *thresholds)
+    print(f"{EARLIER_TOPIC!r} -> {turn and turn['context_ids']}")
+    assert turn is not None and turn["context_ids"] == ["refunds"]
+
+    (embedding,) = embed([UNRELATED])
+    turn = follow_up_turn(turns, UNRELATED, embedding, *thresholds)
+    print(f"{UNRELATED!r} -> {turn and turn['context_ids']}")
+    assert turn is None
+
+    assert follow_up_turn([], UNRELATED, embedding, *thresholds) is None
+    history_writer.unflushed.pop(SESSION)
+    print("follow-up check passed")
+    return None
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,114 @@
+# Chunks-per-second benchmark of the staged ingestion pipeline against the
+# per-chunk loop it replaced (embed_documents([chunk]) then insert_one).
+#
+#   python -m benchmarks.ingestion_benchmark --chunks 5000 --batch-size 64
+#
+# Embedding and Mongo are simulated by their costs: a fixed overhead per model
+# call plus a cost per text, and a round trip per write. Sleeping releases the
+# GIL like model inference and socket waits do. Pass --model to embed with the
+# configured sentence-transformer instead.
+import argparse
+import asyncio
+import time
+import numpy as np
+from models.vector_index import EMBEDDING_DIM
+from models.ingestion_pipeline import IngestionPipeline
+
+
+class InsertResult:
+    def __init__(self, inserted_ids):
+        self.inserted_ids = inserted_ids
+        self.inserted_id = inserted_ids[0] if inserted_ids else None
+
+
+# Collection that costs one round trip plus a small cost per document
+class SimulatedCollection:
+    def __init__(self, round_trip_ms: float, document_ms: float):
+        self.round_trip = round_trip_ms / 1000
+        self.document = document_ms / 1000
+        self.count = 0
+
+    async def insert_many(self, documents, ordered=True):
+        await asyncio.sleep(self.round_trip + self.document * len(documents))
+        self.count += len(documents)
+        return InsertResult(list(range(self.count - len(documents), self.count)))
+
+    async def insert_one(self, document):
+        return await self.insert_many([document])
+
+
+def simulated_embedder(call_ms: float, text_ms: float):
+    def embed_documents(texts):
+        time.sleep((call_ms + text_ms * len(texts)) / 1000)
+        return np.zeros((len(texts), EMBEDDING_DIM), dtype=np.float32)
+
+    return embed_documents
+
+
+def documents(count: int):
+    for number in range(count):
+        yield {"source": "benchmark", "text": f"chunk {number} " * 60, "status": 1}
+
+
+# The loop before the pipeline: one model call and one write per chunk
+async def per_chunk_loop(collection, embed_documents, count: int) -> float:
+    started = time.perf_counter()
+    for document in documents(count):
+        (embedding,) = embed_documents([document["text"]])
+        await collection.insert_one(dict(document, embedding=embedding.tobytes()))
+    return time.perf_counter() - started
+
+
+async def pipeline(collection, embed_documents, count: int, args) -> float:
+    started = time.perf_counter()
+    await IngestionPipeline(
+        collection,
+        batch_size=args.batch_size,
+        queue_batches=args.queue_batches,
+        embed_workers=args.embed_workers,
+        insert_workers=args.insert_workers,
+        embed_documents=embed_documents,
+        update_indexes=False,
+    ).run(documents(count))
+    return time.perf_counter() - started
+
+
+def report(mode: str, chunks: int, seconds: float, baseline: float = None) -> None:
+    speedup = f"{baseline / seconds:>9.1f}x" if baseline else ""
+    print(f"{mode:<12}{chunks:>8}{seconds:>10.2f}{chunks / seconds:>12.1f}{speedup}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--chunks", type=int, default=5000)
+    parser.add_argument("--loop-chunks", type=int, default=500)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--queue-batches", type=int, default=4)
+    parser.add_argument("--embed-workers", type=int, default=2)
+    parser.add_argument("--insert-workers", type=int, default=2)
+    parser.add_argument("--embed-call-ms", type=float, default=8.0)
+    parser.add_argument("--embed-text-ms", type=float, default=0.5)
+    parser.add_argument("--round-trip-ms", type=float, default=2.0)
+    parser.add_argument("--document-ms", type=float, default=0.02)
+    parser.add_argument("--model", action="store_true")
+    args = parser.parse_args()
+
+    if args.model:
+        from models.embedding_models import embedding_models
+
+        embed_documents = embedding_models.get().embed_documents
+        embed_documents(["warm up"])
+    else:
+        embed_documents = simulated_embedder(args.embed_call_ms, args.embed_text_ms)
+
+    print(
+        f"batch_size={args.batch_size} embed_workers={args.embed_workers} "
+        f"insert_workers={args.insert_workers}"
+    )
+    print(f"{'mode':<12}{'chunks':>8}{'seconds':>10}{'chunks/s':>12}{'speedup':>10}")
+    collection = SimulatedCollection(args.round_trip_ms, args.document_ms)
+    seconds = asyncio.run(per_chunk_loop(collection, embed_documents, args.loop_chunks))
+    report("per-chunk", args.loop_chunks, seconds)
+    loop_rate = args.loop_chunks / seconds
+    seconds = asyncio.run(pipeline(collection, embed_documents, args.chunks, args))
+    report("pipeline", args.chunks, seconds, args.chunks / loop_rate)
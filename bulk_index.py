@@ -0,0 +1,409 @@
+# Path: bulk_index.py
+#
+# Index a directory, or a zip or tar archive, of pdf, docx and txt files
+# offline, without going through the HTTP endpoints:
+#
+#   python bulk_index.py path/to/documents --workers 8
+#   python bulk_index.py manuals.tar.gz
+#
+# Files are parsed by TextProcessor on a process pool. Their chunks go through
+# the ingestion pipeline (batched embedding, unordered insert_many) with the
+# same per-source deduplication as the API, so unchanged files cost nothing.
+# With VECTOR_SEGMENT_DIR set, the embeddings are also appended to the on-disk
+# vector segments: serving nodes map those and only scan MongoDB while there
+# are none. Completed files are appended to a checkpoint file once their rows
+# are in a segment, and an interrupted run resumes after them.
+import argparse
+import asyncio
+import multiprocessing
+import os
+import queue
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+import numpy as np
+from bson import ObjectId
+from concurrent.futures import ProcessPoolExecutor
+from config.mongo_db import mongo_db
+from config.settings import settings
+from config.executors import io_executor, run_in_executor
+from models.ingestion_pipeline import IngestionPipeline
+from models.read_upload_file import TextProcessor
+from models.source_manifest import SourceSync, file_hash, source_manifests
+from models.search_filter import make_metadata
+from models.embedding_codec import decode_embedding
+from models.vector_index import vector_index
+
+SUPPORTED_FORMATS = (".pdf", ".docx", ".txt")
+
+# Ends the stream of chunk documents fed to the pipeline
+END = object()
+
+
+def is_supported(name: str) -> bool:
+    return os.path.splitext(name.lower())[1] in SUPPORTED_FORMATS
+
+
+# Supported files of a directory or archive, as (key, source) in a stable
+# order; the key names the file in the checkpoint, the source its chunks
+def list_files(path: str) -> list:
+    if os.path.isdir(path):
+        files = [
+            os.path.join(root, name)
+            for root, _, names in os.walk(path)
+            for name in names
+            if is_supported(name)
+        ]
+        return [(file, os.path.abspath(file)) for file in sorted(files)]
+    archive = os.path.basename(path)
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zip_file:
+            names = [
+                info.filename
+                for info in zip_file.infolist()
+                if not info.is_dir() and is_supported(info.filename)
+            ]
+    elif tarfile.is_tarfile(path):
+        with tarfile.open(path) as tar_file:
+            names = [
+                member.name
+                for member in tar_file
+                if member.isfile() and is_supported(member.name)
+            ]
+    else:
+        raise ValueError(f"{path} is not a directory, zip or tar archive")
+    return [(name, f"{archive}/{name}") for name in names]
+
+
+# Files to parse as (key, source, path, temporary). Archive members are
+# extracted one at a time, in archive order, into `directory`; the parse
+# worker deletes them once read.
+def stage_files(path: str, files: list, directory: str):
+    wanted = dict(files)
+    if os.path.isdir(path):
+        for key, source in files:
+            yield key, source, key, False
+        return
+    if zipfile.is_zipfile(path):
+        with zipfile.ZipFile(path) as zip_file:
+            for key, source in files:
+                yield key, source, extract(zip_file.open(key), key, directory), True
+        return
+    with tarfile.open(path, mode="r|*") as tar_file:
+        for member in tar_file:
+            if member.name in wanted:
+                yield member.name, wanted[member.name], extract(
+                    tar_file.extractfile(member), member.name, directory
+                ), True
+
+
+def extract(member, name: str, directory: str) -> str:
+    file_descriptor, path = tempfile.mkstemp(
+        suffix=os.path.splitext(name)[1].lower(), dir=directory
+    )
+    with member, os.fdopen(file_descriptor, "wb") as file:
+        shutil.copyfileobj(member, file, 1 << 20)
+    return path
+
+
+# Runs in a pool worker: the chunk documents, page count and hash of a file
+def parse_file(path: str, source: str, temporary: bool) -> dict:
+    try:
+        progress = {"pages": 0}
+        text_processor = TextProcessor(path, source=source, parallel_pages=False)
+        documents = list(text_processor.extract_text(progress))
+        return {
+            "documents": documents,
+            "pages": progress["pages"],
+            "content_hash": file_hash(path),
+        }
+    except Exception as e:
+        return {"error": f"{type(e).__name__}: {e}"}
+    finally:
+        if temporary:
+            os.remove(path)
+
+
+# Embeddings of the stored chunks appended to the vector segments in
+# segments of VECTOR_SEGMENT_ROWS rows
+class SegmentWriter:
+    def __init__(self, segment_store, rows: int):
+        self.segment_store = segment_store
+        self.rows = rows
+        self.ids, self.vectors, self.sources = [], [], []
+
+    @property
+    def is_full(self) -> bool:
+        return len(self.ids) >= self.rows
+
+    def add(self, doc_id, embedding, source: str) -> None:
+        self.ids.append(ObjectId(doc_id).binary)
+        self.vectors.append(embedding)
+        self.sources.append(source)
+        return None
+
+    # Hand the buffered rows over for one append and start a new buffer
+    def take(self) -> tuple:
+        rows = (self.ids, self.vectors, self.sources)
+        self.ids, self.vectors, self.sources = [], [], []
+        return rows
+
+    def append(self, rows: tuple) -> None:
+        ids, vectors, sources = rows
+        if not ids:
+            return None
+        ids = np.array(ids, dtype="V12")
+        self.segment_store.append(
+            ids, vector_index.normalize(vectors), make_metadata(ids, sources)
+        )
+        return None
+
+    # Ids of `doc_ids` that no segment holds yet
+    def unsegmented(self, doc_ids: list) -> list:
+        wanted = np.array([ObjectId(doc_id).binary for doc_id in doc_ids], dtype="S12")
+        present = np.zeros(len(wanted), dtype=bool)
+        with self.segment_store.lock():
+            for segment in self.segment_store.read_manifest():
+                ids = self.segment_store.open_segment(segment)[0]
+                present |= np.isin(wanted, np.ascontiguousarray(ids).view("S12"))
+        return [doc_id for doc_id, found in zip(doc_ids, present) if not found]
+
+
+class BulkIndexer:
+    def __init__(self, args):
+        self.path = args.path
+        self.workers = args.workers
+        self.checkpoint_path = args.checkpoint or f"{args.path.rstrip('/')}.checkpoint"
+        self.report_seconds = args.report_seconds
+        self.batch_size = args.batch_size
+        self.files_done = self.files_failed = self.pages = 0
+        self.unchanged = 0
+        # Files whose new chunks are still in the pipeline: source -> [key,
+        # sync, chunks left to store]
+        self.pending = {}
+        # Files whose chunks are all stored but may still be buffered by the
+        # segment writer, committed by the next segment append
+        self.stored = []
+        self.commits = []
+        # Appends run one at a time, so a commit follows every earlier append
+        self.append_lock = asyncio.Lock()
+        self.documents = queue.Queue(maxsize=4 * args.batch_size)
+
+    def load_checkpoint(self) -> set:
+        if not os.path.exists(self.checkpoint_path):
+            return set()
+        with open(self.checkpoint_path) as checkpoint:
+            return {line.rstrip("\n") for line in checkpoint if line.strip()}
+
+    def mark_done(self, key: str) -> None:
+        self.checkpoint.write(key + "\n")
+        self.checkpoint.flush()
+        self.files_done += 1
+        return None
+
+    # Record the new hashes of a file once all of its chunks are stored
+    async def commit(self, key: str, sync: SourceSync) -> None:
+        await source_manifests.commit(sync)
+        self.mark_done(key)
+        return None
+
+    # Chunks of the batch skipped as already stored (by an earlier run that
+    # was interrupted before its segment was written, or by the API) and not
+    # in any segment yet, with their stored ids and embeddings
+    async def unsegmented_duplicates(self, batch: list, inserted: list) -> list:
+        rows = {document["row"] for document in inserted}
+        skipped = {
+            (document["source"], document["content_hash"])
+            for row, document in enumerate(batch)
+            if row not in rows
+        }
+        if not skipped:
+            return []
+        stored = await self.docs_collection.find(
+            {
+                "source": {"$in": sorted({source for source, _ in skipped})},
+                "content_hash": {
+                    "$in": sorted({content_hash for _, content_hash in skipped})
+                },
+                "status": 1,
+            },
+            {"source": 1, "content_hash": 1, "embedding": 1},
+        ).to_list(length=None)
+        stored = {
+            document["_id"]: document
+            for document in stored
+            if (document["source"], document["content_hash"]) in skipped
+        }
+        missing = await run_in_executor(
+            io_executor, self.segment_writer.unsegmented, list(stored)
+        )
+        return [stored[doc_id] for doc_id in missing]
+
+    async def on_batch(self, batch: list, inserted: list, embeddings) -> None:
+        duplicates = []
+        if self.segment_writer is not None:
+            duplicates = await self.unsegmented_duplicates(batch, inserted)
+        # Buffer the rows and settle the files without awaiting, so files are
+        # only committed by an append that holds all of their rows
+        if self.segment_writer is not None:
+            for document in inserted:
+                self.segment_writer.add(
+                    document["_id"], embeddings[document["row"]], document["source"]
+                )
+            for document in duplicates:
+                self.segment_writer.add(
+                    document["_id"],
+                    decode_embedding(document["embedding"]),
+                    document["source"],
+                )
+        for document in batch:
+            entry = self.pending[document["source"]]
+            entry[2] -= 1
+            if not entry[2]:
+                del self.pending[document["source"]]
+                self.stored.append((entry[0], entry[1]))
+        if self.segment_writer is None or self.segment_writer.is_full:
+            await self.flush_segments()
+        return None
+
+    # Append the buffered rows as a segment, then commit the files stored so
+    # far: a file is never checkpointed while its rows are only in memory
+    async def flush_segments(self) -> None:
+        async with self.append_lock:
+            stored, self.stored = self.stored, []
+            if self.segment_writer is not None:
+                await run_in_executor(
+                    io_executor, self.segment_writer.append, self.segment_writer.take()
+                )
+            self.commits += [
+                asyncio.ensure_future(self.commit(key, sync)) for key, sync in stored
+            ]
+        return None
+
+    async def handle(self, key: str, source: str, parsed: dict) -> None:
+        if "error" in parsed:
+            self.files_failed += 1
+            print(f"failed {key}: {parsed['error']}")
+            return None
+        self.pages += parsed["pages"]
+        manifest = await source_manifests.manifests_collection.find_one({"_id": source})
+        sync = SourceSync(source, manifest, parsed["content_hash"])
+        if sync.is_unchanged:
+            self.unchanged += manifest["chunks"]
+            self.mark_done(key)
+            return None
+        documents = list(sync.new_documents(parsed["documents"]))
+        self.unchanged += sync.unchanged
+        if not documents:
+            await self.commit(key, sync)
+            return None
+        self.pending[source] = [key, sync, len(documents)]
+        for document in documents:
+            await run_in_executor(io_executor, self.documents.put, document)
+        return None
+
+    # Stage the files, parse them on the process pool with a bounded number
+    # in flight, and feed their new chunks to the pipeline
+    async def feed(self, files: list, directory: str) -> None:
+        loop = asyncio.get_running_loop()
+        staged = stage_files(self.path, files, directory)
+        in_flight = set()
+        with ProcessPoolExecutor(
+            max_workers=self.workers, mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            while True:
+                item = await run_in_executor(io_executor, next, staged, None)
+                if item is not None:
+                    key, source, path, temporary = item
+                    future = loop.run_in_executor(
+                        pool, parse_file, path, source, temporary
+                    )
+                    future.file = (key, source)
+                    in_flight.add(future)
+                if not in_flight:
+                    break
+                if item is not None and len(in_flight) < 2 * self.workers:
+                    continue
+                done, in_flight = await asyncio.wait(
+                    in_flight, return_when=asyncio.FIRST_COMPLETED
+                )
+                for future in done:
+                    await self.handle(*future.file, future.result())
+        await run_in_executor(io_executor, self.documents.put, END)
+        return None
+
+    def report(self, total: int, started: float) -> None:
+        seconds = time.perf_counter() - started
+        files_rate = self.files_done / seconds if seconds else 0.0
+        remaining = total - self.files_done - self.files_failed
+        eta = f"{remaining / files_rate:.0f}s" if files_rate else "?"
+        print(
+            f"{self.files_done}/{total} files, {self.pages} pages, "
+            f"{self.pipeline.chunks} chunks stored, "
+            f"{self.unchanged} unchanged | {files_rate:.1f} files/s, "
+            f"{self.pipeline.chunks / seconds:.1f} chunks/s | ETA {eta}"
+        )
+        return None
+
+    async def reporter(self, total: int, started: float) -> None:
+        while True:
+            await asyncio.sleep(self.report_seconds)
+            self.report(total, started)
+
+    async def run(self) -> None:
+        files = await run_in_executor(io_executor, list_files, self.path)
+        done = self.load_checkpoint()
+        files = [(key, source) for key, source in files if key not in done]
+        total = len(files)
+        print(f"{total} files to index ({len(done)} already done)")
+        await source_manifests.ensure_indexes()
+
+        self.segment_writer = None
+        if vector_index.segment_store is not None:
+            # Bootstrap the store from MongoDB first if it is empty, so the
+            # appended segments do not shadow the existing corpus
+            await run_in_executor(
+                io_executor,
+                vector_index.load_from_mongodb,
+                mongo_db["RAG_DB"]["Upload_Docs"],
+            )
+            self.segment_writer = SegmentWriter(
+                vector_index.segment_store, settings.vector_segment_rows
+            )
+
+        self.docs_collection = mongo_db.get_async_database("RAG_DB")["Upload_Docs"]
+        self.pipeline = IngestionPipeline(
+            self.docs_collection,
+            batch_size=self.batch_size,
+            parse_executor=io_executor,
+            update_indexes=False,
+            on_batch=self.on_batch,
+        )
+        started = time.perf_counter()
+        reporter = asyncio.ensure_future(self.reporter(total, started))
+        with open(self.checkpoint_path, "a") as self.checkpoint:
+            with tempfile.TemporaryDirectory(prefix="bulk_index_") as directory:
+                await asyncio.gather(
+                    self.feed(files, directory),
+                    self.pipeline.run(iter(self.documents.get, END)),
+                )
+                await self.flush_segments()
+                await asyncio.gather(*self.commits)
+        reporter.cancel()
+        self.report(total, started)
+        if self.files_failed:
+            print(f"{self.files_failed} files failed; run again to retry them")
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("path", help="directory, zip or tar archive")
+    parser.add_argument("--workers", type=int, default=settings.parse_processes)
+    parser.add_argument("--batch-size", type=int, default=settings.ingest_batch_size)
+    parser.add_argument("--checkpoint", help="default: <path>.checkpoint")
+    parser.add_argument("--report-seconds", type=float, default=5.0)
+    args = parser.parse_args()
+    asyncio.run(BulkIndexer(args).run())
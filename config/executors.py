@@ -0,0 +1,50 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from config.settings import settings
+
+# CPU-bound work kept off the event loop: embedding, index scoring and file
+# parsing (numpy and torch release the GIL while they compute)
+cpu_executor = ThreadPoolExecutor(
+    max_workers=settings.cpu_workers, thread_name_prefix="cpu"
+)
+
+# Blocking I/O of libraries without an async API: page fetches and SQLite
+io_executor = ThreadPoolExecutor(
+    max_workers=settings.io_workers, thread_name_prefix="io"
+)
+
+# Processes that extract document pages in parallel, started on first use.
+# Workers are spawned rather than forked so they do not inherit the server's
+# threads and client connections.
+process_executor = None
+process_executor_lock = threading.Lock()
+
+
+def parse_process_executor() -> ProcessPoolExecutor:
+    global process_executor
+    with process_executor_lock:
+        if process_executor is None:
+            process_executor = ProcessPoolExecutor(
+                max_workers=settings.parse_processes,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+    return process_executor
+
+
+def shutdown_process_executor() -> None:
+    global process_executor
+    with process_executor_lock:
+        if process_executor is not None:
+            process_executor.shutdown(cancel_futures=True)
+            process_executor = None
+    return None
+
+
+async def run_in_executor(executor, function, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(
+        executor, functools.partial(function, *args, **kwargs)
+    )
@@ -0,0 +1,81 @@
+import threading
+from collections import deque
+
+# Recent observations kept per histogram to compute percentiles
+HISTOGRAM_WINDOW = 1024
+
+
+# Running count, sum and extremes of a measurement plus a window of recent
+# values for percentiles
+class Histogram:
+    def __init__(self, window: int = HISTOGRAM_WINDOW):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.recent = deque(maxlen=window)
+
+    def observe(self, value: float) -> None:
+        self.count += 1
+        self.total += value
+        self.min = value if self.min is None else min(self.min, value)
+        self.max = value if self.max is None else max(self.max, value)
+        self.recent.append(value)
+        return None
+
+    def percentile(self, fraction: float) -> float:
+        values = sorted(self.recent)
+        return values[min(len(values) - 1, int(fraction * len(values)))]
+
+    def summary(self) -> dict:
+        if not self.count:
+            return {"count": 0}
+        return {
+            "count": self.count,
+            "mean": self.total / self.count,
+            "min": self.min,
+            "max": self.max,
+            "p50": self.percentile(0.50),
+            "p95": self.percentile(0.95),
+            "p99": self.percentile(0.99),
+        }
+
+
+# Process-wide counters, gauges and histograms, reported by the /metrics endpoint
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+        return None
+
+    def set_gauge(self, name: str, value: float) -> None:
+        with self.lock:
+            self.gauges[name] = value
+        return None
+
+    def observe(self, name: str, value: float) -> None:
+        with self.lock:
+            if name not in self.histograms:
+                self.histograms[name] = Histogram()
+            self.histograms[name].observe(value)
+        return None
+
+    def snapshot(self) -> dict:
+        with self.lock:
+            return {
+                "counters": dict(self.counters),
+                "gauges": dict(self.gauges),
+                "histograms": {
+                    name: histogram.summary()
+                    for name, histogram in self.histograms.items()
+                },
+            }
+
+
+metrics = Metrics()
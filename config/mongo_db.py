@@ -1,5 +1,6 @@
 import os
 from pymongo import MongoClient
+from motor.motor_asyncio import AsyncIOMotorClient
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,9 +12,18 @@ class MongoDB:
         self.connection_string = os.getenv("MONGODB_CONNECTION_STRING_URI")
         # Create a MongoClient using the connection string
         self.client = MongoClient(self.connection_string)
+        # Non-blocking client used on the async request path
+        self.async_client = AsyncIOMotorClient(self.connection_string)
 
     def get_client(self):
         return self.client
 
+    def get_async_database(self, name: str):
+        return self.async_client[name]
+
+    # Allow mongo_db["RAG_DB"] to resolve the database on the client
+    def __getitem__(self, name: str):
+        return self.client[name]
+
 
 mongo_db = MongoDB()
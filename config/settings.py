@@ -0,0 +1,190 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+class Settings:
+    def __init__(self):
+        # Directory of the append-only embedding segments shared by all workers
+        self.vector_segment_dir = os.getenv("VECTOR_SEGMENT_DIR", "vector_segments")
+        # Rows per segment written while bootstrapping the store from MongoDB
+        self.vector_segment_rows = int(os.getenv("VECTOR_SEGMENT_ROWS", "50000"))
+        # Segments of similar size are merged once this many share a size tier,
+        # and the smallest ones once the store holds more than the maximum
+        self.vector_merge_factor = int(os.getenv("VECTOR_MERGE_FACTOR", "4"))
+        self.vector_max_segments = int(os.getenv("VECTOR_MAX_SEGMENTS", "64"))
+
+        # "exact" brute-force scoring or "ivf" approximate nearest neighbours
+        self.vector_search_mode = os.getenv("VECTOR_SEARCH_MODE", "exact")
+        # IVF cells (0 picks 4 * sqrt(rows)) and cells probed per query
+        self.ivf_nlist = int(os.getenv("IVF_NLIST", "0"))
+        self.ivf_nprobe = int(os.getenv("IVF_NPROBE", "16"))
+        # Rows sampled and k-means iterations used to train the IVF centroids
+        self.ivf_train_size = int(os.getenv("IVF_TRAIN_SIZE", "50000"))
+        self.ivf_iterations = int(os.getenv("IVF_ITERATIONS", "10"))
+        # Below this many rows exact search is used even in "ivf" mode
+        self.ivf_min_rows = int(os.getenv("IVF_MIN_ROWS", "20000"))
+
+        # "none", "int8" scalar or "pq" product quantization of the search codes
+        self.vector_quantization = os.getenv("VECTOR_QUANTIZATION", "none")
+        # Bytes per PQ code: 96 subspaces of 4 dimensions is 16x smaller rows
+        self.pq_subspaces = int(os.getenv("PQ_SUBSPACES", "96"))
+        # Candidates per block re-scored with the full-precision vectors
+        self.quantization_rerank_size = int(
+            os.getenv("QUANTIZATION_RERANK_SIZE", "200")
+        )
+        # Rows sampled and k-means iterations used to train the quantizer
+        self.quantization_train_size = int(
+            os.getenv("QUANTIZATION_TRAIN_SIZE", "50000")
+        )
+        self.quantization_iterations = int(os.getenv("QUANTIZATION_ITERATIONS", "10"))
+        # Below this many rows the full-precision vectors are scored directly
+        self.quantization_min_rows = int(os.getenv("QUANTIZATION_MIN_ROWS", "20000"))
+
+        # Filtered searches with at most this many allowed rows per block skip
+        # IVF and quantization and score those rows exactly
+        self.filter_exact_rows = int(os.getenv("FILTER_EXACT_ROWS", "20000"))
+
+        # Fuse BM25 keyword matches with the dense matches (0 disables)
+        self.hybrid_search = os.getenv("HYBRID_SEARCH", "1") == "1"
+        # Candidates taken from each side before fusion (0 uses the query top_k)
+        self.hybrid_dense_top_k = int(os.getenv("HYBRID_DENSE_TOP_K", "0"))
+        self.hybrid_lexical_top_k = int(os.getenv("HYBRID_LEXICAL_TOP_K", "0"))
+        # Keyword matches scoring below this BM25 score are ignored
+        self.lexical_min_score = float(os.getenv("LEXICAL_MIN_SCORE", "1.0"))
+        # Rank constant of reciprocal-rank fusion
+        self.rrf_k = int(os.getenv("RRF_K", "60"))
+
+        # Sentence-transformers model used for every embedding
+        self.embedding_model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        # Concurrent query embeddings are batched until this many are queued
+        self.embedding_batch_size = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+        # or the first queued query has waited this long
+        self.embedding_max_wait_ms = float(os.getenv("EMBEDDING_MAX_WAIT_MS", "5"))
+
+        # SQLite file of the persistent embedding cache (empty: memory only)
+        self.embedding_cache_path = os.getenv(
+            "EMBEDDING_CACHE_PATH", "embedding_cache.sqlite3"
+        )
+        # Embeddings kept in the in-memory LRU tier
+        self.embedding_cache_size = int(os.getenv("EMBEDDING_CACHE_SIZE", "20000"))
+        # Embeddings kept in the SQLite tier, least recently used pruned first
+        # (0: unbounded)
+        self.embedding_cache_disk_size = int(
+            os.getenv("EMBEDDING_CACHE_DISK_SIZE", "500000")
+        )
+
+        # Reuse answers to near-identical queries over the same chunks (0 disables)
+        self.response_cache = os.getenv("RESPONSE_CACHE", "1") == "1"
+        # Cosine similarity of the query embeddings needed for a cache hit
+        self.response_cache_threshold = float(
+            os.getenv("RESPONSE_CACHE_THRESHOLD", "0.95")
+        )
+        # Seconds a cached answer stays valid and answers kept per worker
+        self.response_cache_ttl = float(os.getenv("RESPONSE_CACHE_TTL", "3600"))
+        self.response_cache_size = int(os.getenv("RESPONSE_CACHE_SIZE", "1000"))
+
+        # Threads running CPU-bound work and blocking I/O off the event loop
+        self.cpu_workers = int(os.getenv("CPU_WORKERS", str(os.cpu_count() or 4)))
+        self.io_workers = int(os.getenv("IO_WORKERS", "32"))
+
+        # Per provider: HTTP connection pool size, concurrent calls, and a
+        # token-bucket rate limit in requests per second (0 disables) and burst
+        self.provider_limits = {
+            provider: {
+                "max_connections": int(os.getenv(f"{prefix}_MAX_CONNECTIONS", "100")),
+                "max_concurrency": int(os.getenv(f"{prefix}_MAX_CONCURRENCY", "64")),
+                "rate_limit": float(os.getenv(f"{prefix}_RATE_LIMIT", "0")),
+                "rate_burst": int(os.getenv(f"{prefix}_RATE_BURST", "10")),
+            }
+            for provider, prefix in (
+                ("openai", "OPENAI"),
+                ("gemini", "GEMINI"),
+                ("llama", "LLAMA"),
+            )
+        }
+        # Hugging Face chat model served for the "llama" provider
+        self.llama_model_name = os.getenv(
+            "LLAMA_MODEL_NAME", "meta-llama/Meta-Llama-3-8B-Instruct"
+        )
+
+        # Estimated prompt tokens of retrieved context sent to each provider
+        # (0 sends every retrieved chunk)
+        self.context_token_budgets = {
+            "openai": int(os.getenv("OPENAI_CONTEXT_TOKENS", "3000")),
+            "gemini": int(os.getenv("GEMINI_CONTEXT_TOKENS", "3000")),
+            "llama": int(os.getenv("LLAMA_CONTEXT_TOKENS", "2000")),
+        }
+        # Weight of relevance against diversity when picking context chunks
+        self.context_mmr_lambda = float(os.getenv("CONTEXT_MMR_LAMBDA", "0.7"))
+        # Chunks this similar to an already picked chunk are dropped
+        self.context_duplicate_threshold = float(
+            os.getenv("CONTEXT_DUPLICATE_THRESHOLD", "0.95")
+        )
+
+        # A query without matching documents reuses the context of one of the
+        # last FOLLOW_UP_TURNS turns of its session: the turn whose query or
+        # answer it is most similar to when that reaches the threshold, or the
+        # latest turn for a bare follow-up ("explain more") reaching the lower
+        # bare threshold
+        self.follow_up_turns = int(os.getenv("FOLLOW_UP_TURNS", "5"))
+        self.follow_up_threshold = float(os.getenv("FOLLOW_UP_THRESHOLD", "0.3"))
+        self.follow_up_bare_threshold = float(
+            os.getenv("FOLLOW_UP_BARE_THRESHOLD", "0.0")
+        )
+
+        # Write-behind RAG_History writer: records per insert_many, longest wait
+        # before a partial batch is written, buffered records before writers wait
+        # for room, and retries of a failed batch before it is dropped
+        self.history_batch_size = int(os.getenv("HISTORY_BATCH_SIZE", "100"))
+        self.history_flush_ms = float(os.getenv("HISTORY_FLUSH_MS", "200"))
+        self.history_max_pending = int(os.getenv("HISTORY_MAX_PENDING", "10000"))
+        self.history_flush_retries = int(os.getenv("HISTORY_FLUSH_RETRIES", "3"))
+
+        # Ingestion pipeline: chunks per embedding call and insert_many, batches
+        # buffered between stages, and concurrent embed and insert workers
+        self.ingest_batch_size = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+        self.ingest_queue_batches = int(os.getenv("INGEST_QUEUE_BATCHES", "4"))
+        self.ingest_embed_workers = int(os.getenv("INGEST_EMBED_WORKERS", "2"))
+        self.ingest_insert_workers = int(os.getenv("INGEST_INSERT_WORKERS", "2"))
+
+        # Background ingestion jobs: concurrent jobs per process, seconds a running
+        # job's lease lasts without a heartbeat, idle poll interval for jobs
+        # queued by other processes, and attempts before a job fails
+        self.job_workers = int(os.getenv("JOB_WORKERS", "2"))
+        self.job_lease_seconds = float(os.getenv("JOB_LEASE_SECONDS", "60"))
+        self.job_poll_seconds = float(os.getenv("JOB_POLL_SECONDS", "5"))
+        self.job_max_attempts = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+
+        # Document parsing: worker processes extracting PDF pages, pages submitted
+        # to them at a time, and characters per block of streamed docx/text files
+        self.parse_processes = int(
+            os.getenv("PARSE_PROCESSES", str(os.cpu_count() or 1))
+        )
+        self.parse_pages_in_flight = int(os.getenv("PARSE_PAGES_IN_FLIGHT", "16"))
+        self.parse_block_chars = int(os.getenv("PARSE_BLOCK_CHARS", "20000"))
+
+        # Streaming uploads: directory the uploaded files are kept in until their
+        # job ends, bytes of a file held in memory before it is spooled to disk,
+        # bytes per disk write, and the largest accepted file (0 for no limit)
+        self.upload_dir = os.getenv("UPLOAD_DIR", "uploads")
+        self.upload_spool_bytes = int(os.getenv("UPLOAD_SPOOL_BYTES", str(1 << 20)))
+        self.upload_block_bytes = int(os.getenv("UPLOAD_BLOCK_BYTES", str(1 << 20)))
+        self.upload_max_bytes = int(os.getenv("UPLOAD_MAX_BYTES", str(500 << 20)))
+
+        # Website crawling: pooled connections in total and requests per host at
+        # a time, pages fetched ahead of ingestion, request timeouts, the largest
+        # page read, and the most links a landing page may have
+        self.crawl_connections = int(os.getenv("CRAWL_CONNECTIONS", "100"))
+        self.crawl_per_host = int(os.getenv("CRAWL_PER_HOST", "8"))
+        self.crawl_pages_in_flight = int(os.getenv("CRAWL_PAGES_IN_FLIGHT", "16"))
+        self.crawl_timeout_seconds = float(os.getenv("CRAWL_TIMEOUT_SECONDS", "30"))
+        self.crawl_connect_timeout_seconds = float(
+            os.getenv("CRAWL_CONNECT_TIMEOUT_SECONDS", "10")
+        )
+        self.crawl_max_page_bytes = int(os.getenv("CRAWL_MAX_PAGE_BYTES", str(5 << 20)))
+        self.crawl_max_urls = int(os.getenv("CRAWL_MAX_URLS", "100"))
+
+
+settings = Settings()
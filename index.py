@@ -1,6 +1,77 @@
 # Path: index.py
 from fastapi import FastAPI
 from routes.routes import router
+from config.mongo_db import mongo_db
+from config.settings import settings
+from models.embedding_models import embedding_models
+from models.vector_index import vector_index
+from models.lexical_index import lexical_index
+from models.provider_clients import provider_pools
+from models.history_writer import history_writer
+from models.ingestion_jobs import ingestion_jobs
+from models.source_manifest import source_manifests
+from models.web_crawler import web_crawler
+from config.executors import shutdown_process_executor
 
 app = FastAPI()
 app.include_router(router)
+
+
+# Load and warm up the embedding model once per process
+@app.on_event("startup")
+def warm_up_embedding_models():
+    embedding_models.warm_up()
+
+
+# Build the resident vector and keyword indexes once before serving queries
+@app.on_event("startup")
+def load_search_indexes():
+    docs_collection = mongo_db["RAG_DB"]["Upload_Docs"]
+    mongo_db["RAG_DB"]["RAG_History"].create_index([("session_id", 1), ("_id", -1)])
+    vector_index.load_from_mongodb(docs_collection)
+    if settings.hybrid_search:
+        lexical_index.load_from_mongodb(docs_collection)
+
+
+# Start writing buffered history in the background
+@app.on_event("startup")
+async def start_history_writer():
+    history_writer.start()
+
+
+# Write the buffered history before the process exits
+@app.on_event("shutdown")
+async def flush_history_writer():
+    await history_writer.close()
+
+
+# Start the ingestion job workers; jobs left by a stopped process resume
+@app.on_event("startup")
+async def start_ingestion_jobs():
+    await source_manifests.ensure_indexes()
+    await ingestion_jobs.start()
+
+
+# Stop the ingestion job workers and hand their jobs back to the queue
+@app.on_event("shutdown")
+async def stop_ingestion_jobs():
+    await ingestion_jobs.close()
+
+
+# Stop the document parsing processes
+@app.on_event("shutdown")
+def stop_parse_processes():
+    shutdown_process_executor()
+
+
+# Close the pooled website crawling connections
+@app.on_event("shutdown")
+async def close_web_crawler():
+    await web_crawler.close()
+
+
+# Close the pooled provider connections
+@app.on_event("shutdown")
+async def close_provider_clients():
+    for pool in provider_pools.values():
+        await pool.close()
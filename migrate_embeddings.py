@@ -0,0 +1,51 @@
+# Path: migrate_embeddings.py
+#
+# Convert the embeddings stored in Upload_Docs from arrays of BSON doubles to
+# packed float32 BSON Binary, in place and in batches:
+#
+#   python migrate_embeddings.py --batch-size 1000
+#
+# The conversion is idempotent: only documents whose embedding is still an
+# array are read, so an interrupted run can simply be started again.
+import argparse
+import time
+from pymongo import UpdateOne
+from config.mongo_db import mongo_db
+from models.embedding_codec import encode_embedding
+
+
+def migrate_embeddings(docs_collection, batch_size: int, dry_run: bool) -> int:
+    legacy = {"embedding": {"$type": "array"}}
+    total = docs_collection.count_documents(legacy)
+    print(f"{total} documents with array embeddings")
+    if dry_run:
+        return 0
+
+    migrated, started, updates = 0, time.perf_counter(), []
+    cursor = docs_collection.find(legacy, {"embedding": 1}, batch_size=batch_size)
+    for doc in cursor:
+        updates.append(
+            UpdateOne(
+                {"_id": doc["_id"], "embedding": {"$type": "array"}},
+                {"$set": {"embedding": encode_embedding(doc["embedding"])}},
+            )
+        )
+        if len(updates) >= batch_size:
+            migrated += docs_collection.bulk_write(
+                updates, ordered=False
+            ).modified_count
+            updates = []
+            rate = migrated / (time.perf_counter() - started)
+            print(f"{migrated}/{total} migrated ({rate:.0f} docs/s)")
+    if updates:
+        migrated += docs_collection.bulk_write(updates, ordered=False).modified_count
+    print(f"{migrated}/{total} migrated in {time.perf_counter() - started:.1f}s")
+    return migrated
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true")
+    args = parser.parse_args()
+    migrate_embeddings(mongo_db["RAG_DB"]["Upload_Docs"], args.batch_size, args.dry_run)
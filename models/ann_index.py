@@ -0,0 +1,126 @@
+import threading
+import numpy as np
+
+# Rows scored per matmul while assigning vectors to their nearest centroid
+ASSIGN_BATCH_ROWS = 65536
+
+
+# Uniform sample of rows drawn across all index blocks
+def sample_blocks(blocks: list, size: int, rng) -> np.ndarray:
+    total = sum(len(ids) for _, ids, _, _ in blocks)
+    sample_rows = np.sort(rng.choice(total, size=min(size, total), replace=False))
+    sample, offset = [], 0
+    for _, ids, vectors, _ in blocks:
+        rows = sample_rows[(sample_rows >= offset) & (sample_rows < offset + len(ids))]
+        sample.append(np.asarray(vectors[rows - offset], dtype=np.float32))
+        offset += len(ids)
+    return np.concatenate(sample)
+
+
+# Inverted-file (IVF) approximate nearest-neighbour index. A spherical k-means
+# coarse quantizer partitions the normalized vectors into nlist cells; a query
+# only scores the rows of its nprobe closest cells. Postings are kept per
+# index block, so new segments are assigned incrementally without retraining.
+class IVFIndex:
+    def __init__(
+        self,
+        nlist: int = 0,
+        nprobe: int = 16,
+        train_size: int = 50000,
+        iterations: int = 10,
+        seed: int = 0,
+    ):
+        self.nlist = nlist
+        self.nprobe = nprobe
+        self.train_size = train_size
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.centroids = None
+        self.postings = {}
+
+    @property
+    def trained(self) -> bool:
+        return self.centroids is not None
+
+    # Nearest centroid of every row, computed in bounded batches
+    def assign(self, vectors: np.ndarray, centroids: np.ndarray) -> np.ndarray:
+        assignments = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), ASSIGN_BATCH_ROWS):
+            batch = np.asarray(vectors[start : start + ASSIGN_BATCH_ROWS])
+            assignments[start : start + len(batch)] = np.argmax(
+                batch @ centroids.T, axis=1
+            )
+        return assignments
+
+    # Train the coarse quantizer with spherical k-means on a sample of the rows
+    def train(self, blocks: list) -> None:
+        total = sum(len(ids) for _, ids, _, _ in blocks)
+        if total == 0:
+            return None
+        nlist = self.nlist or max(1, int(4 * np.sqrt(total)))
+        nlist = min(nlist, total)
+
+        sample = sample_blocks(blocks, max(self.train_size, nlist), self.rng)
+
+        centroids = sample[self.rng.choice(len(sample), size=nlist, replace=False)]
+        for _ in range(self.iterations):
+            assignments = self.assign(sample, centroids)
+            counts = np.bincount(assignments, minlength=nlist)
+            nonempty = np.flatnonzero(counts)
+            starts = (np.cumsum(counts) - counts)[nonempty]
+            sums = np.zeros_like(centroids)
+            sums[nonempty] = np.add.reduceat(
+                sample[np.argsort(assignments, kind="stable")], starts, axis=0
+            )
+            empty = counts == 0
+            sums[empty] = sample[self.rng.choice(len(sample), size=empty.sum())]
+            centroids = sums / np.linalg.norm(sums, axis=1, keepdims=True)
+
+        with self.lock:
+            self.centroids = centroids
+            self.postings = {}
+        return None
+
+    # Rows of a block grouped by cell: (rows sorted by cell, cell offsets).
+    # Blocks that only grew since the last call assign just their new rows.
+    def block_postings(self, key: str, vectors: np.ndarray) -> tuple:
+        with self.lock:
+            centroids = self.centroids
+            cached = self.postings.get(key)
+        if cached is not None and cached[0] == len(vectors):
+            return cached[2], cached[3]
+
+        assignments = cached[1] if cached is not None else np.empty(0, np.int32)
+        if len(assignments) > len(vectors):
+            assignments = np.empty(0, np.int32)
+        assignments = np.concatenate(
+            [assignments, self.assign(vectors[len(assignments) :], centroids)]
+        )
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.zeros(len(centroids) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(assignments, minlength=len(centroids)), out=offsets[1:])
+        with self.lock:
+            self.postings[key] = (len(vectors), assignments, order, offsets)
+        return order, offsets
+
+    # Cells closest to the query
+    def probe(self, query: np.ndarray, nprobe: int = None) -> np.ndarray:
+        nprobe = min(nprobe or self.nprobe, len(self.centroids))
+        return np.argpartition(self.centroids @ query, -nprobe)[-nprobe:]
+
+    # Rows of a block that fall in the probed cells, in ascending order
+    def candidate_rows(self, key: str, vectors: np.ndarray, cells) -> np.ndarray:
+        order, offsets = self.block_postings(key, vectors)
+        rows = np.concatenate(
+            [order[offsets[cell] : offsets[cell + 1]] for cell in cells]
+        )
+        rows.sort()
+        return rows
+
+    # Drop the postings of blocks that no longer exist, e.g. after compaction
+    def forget(self, live_keys: set) -> None:
+        with self.lock:
+            for key in set(self.postings) - live_keys:
+                del self.postings[key]
+        return None
@@ -0,0 +1,110 @@
+import functools
+import re
+
+# First non-space character at or after a position
+NON_SPACE = re.compile(r"\S")
+
+# Ends of a sentence; a chunk cut there ends just after the punctuation
+SENTENCE_ENDS = (". ", "! ", "? ", "\n")
+WHITESPACE = (" ", "\n", "\t")
+
+
+# Up to `count` whitespace-delimited tokens from a token start. With `overlap`
+# the last `overlap` of them are matched by group 1, whose start is where the
+# next chunk begins.
+@functools.lru_cache(maxsize=16)
+def token_window(count: int, overlap: int):
+    if not overlap:
+        return re.compile(r"\S+(?:\s+\S+){0,%d}" % (count - 1))
+    return re.compile(
+        r"\S+(?:\s+\S+){0,%d}(?:\s+(\S+(?:\s+\S+){0,%d}))?"
+        % (count - overlap - 1, overlap - 1)
+    )
+
+
+def skip_space(text: str, position: int) -> int:
+    match = NON_SPACE.search(text, position)
+    return match.start() if match else len(text)
+
+
+def trim_end(text: str, start: int, end: int) -> int:
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return end
+
+
+# Last sentence end in the second half of [start, end), or 0. Cutting there
+# keeps chunks from shrinking to a fragment of the window.
+def sentence_end(text: str, start: int, end: int) -> int:
+    low, high = start + (end - start) // 2, min(end + 1, len(text))
+    return max(text.rfind(mark, low, high) for mark in SENTENCE_ENDS) + 1
+
+
+# Chunks of `text` as (offset, length) spans, without copying the text.
+# chunk_size and chunk_overlap count characters, or whitespace-delimited tokens
+# with tokens=True. Character chunks end on whitespace; with sentences=True
+# both kinds end on a sentence boundary when one falls in the second half of
+# the window, and then the next chunk starts after it without overlap.
+# Spans never start or end on whitespace.
+def iter_spans(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int = 0,
+    tokens: bool = False,
+    sentences: bool = False,
+):
+    if chunk_size < 1 or not 0 <= chunk_overlap < chunk_size:
+        raise ValueError("chunk_overlap must be in [0, chunk_size)")
+    size = len(text)
+    window = token_window(chunk_size, chunk_overlap) if tokens else None
+    start = skip_space(text, 0)
+    while start < size:
+        if tokens:
+            match = window.match(text, start)
+            end = match.end()
+            overlap_start = match.start(1) if chunk_overlap else -1
+        else:
+            end = start + chunk_size
+            overlap_start = -1
+            if end < size and not text[end].isspace():
+                cut = max(text.rfind(space, start, end) for space in WHITESPACE)
+                end = cut if cut > start else end
+            end = min(end, size)
+        if skip_space(text, end) >= size:
+            yield start, trim_end(text, start, size) - start
+            return
+        cut = sentence_end(text, start, end) if sentences else 0
+        if cut > start:
+            yield start, trim_end(text, start, cut) - start
+            start = skip_space(text, cut)
+            continue
+        end = trim_end(text, start, end)
+        yield start, end - start
+        if tokens:
+            following = overlap_start if overlap_start > start else end
+        elif chunk_overlap:
+            following = max(end - chunk_overlap, start + 1)
+            # Start the overlap on a word rather than inside one, or drop it
+            # when it is a single word
+            breaks = [text.find(space, following - 1, end) for space in WHITESPACE]
+            following = min([b + 1 for b in breaks if b >= 0], default=end)
+        else:
+            following = end
+        start = skip_space(text, following)
+    return None
+
+
+# The chunks as strings: one slice per chunk
+def split_text(
+    text: str,
+    chunk_size: int,
+    chunk_overlap: int = 0,
+    tokens: bool = False,
+    sentences: bool = False,
+) -> list:
+    return [
+        text[offset : offset + length]
+        for offset, length in iter_spans(
+            text, chunk_size, chunk_overlap, tokens, sentences
+        )
+    ]
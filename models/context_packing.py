@@ -0,0 +1,51 @@
+import numpy as np
+
+
+# Rough token count of English text, about four characters per token
+def estimate_tokens(text: str) -> int:
+    return len(text) // 4 + 1
+
+
+def normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+    return vectors / np.where(norms == 0, 1, norms)
+
+
+# Choose the retrieved chunks sent as context, in order of use. Chunks are
+# picked by maximal marginal relevance (relevance to the query minus
+# similarity to the chunks already picked), near-duplicates of a picked chunk
+# are dropped, and chunks that no longer fit the token budget are skipped.
+def pack_context(
+    query_embedding,
+    chunks: list,
+    token_budget: int,
+    mmr_lambda: float = 0.7,
+    duplicate_threshold: float = 0.95,
+) -> list:
+    if not chunks:
+        return []
+    vectors = normalize(
+        np.stack([np.asarray(embedding, np.float32) for _, _, embedding in chunks])
+    )
+    query = normalize(np.asarray(query_embedding, np.float32).reshape(-1))
+    relevance = vectors @ query
+    similarity = vectors @ vectors.T
+
+    remaining = list(range(len(chunks)))
+    selected, used_tokens = [], 0
+    while remaining:
+        if selected:
+            redundancy = similarity[np.ix_(remaining, selected)].max(axis=1)
+        else:
+            redundancy = np.zeros(len(remaining))
+        scores = mmr_lambda * relevance[remaining] - (1 - mmr_lambda) * redundancy
+        best = int(np.argmax(scores))
+        candidate = remaining.pop(best)
+        if redundancy[best] >= duplicate_threshold:
+            continue
+        tokens = estimate_tokens(chunks[candidate][1])
+        if token_budget > 0 and used_tokens + tokens > token_budget:
+            continue
+        selected.append(candidate)
+        used_tokens += tokens
+    return [chunks[row] for row in selected]
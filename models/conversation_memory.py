@@ -0,0 +1,85 @@
+import re
+import numpy as np
+from models.embedding_codec import decode_embedding
+from models.history_writer import history_writer
+
+# A turn answered from retrieved context, as a Mongo filter and in memory
+CONTEXT_TURN = {"context_ids.0": {"$exists": True}}
+
+# Words of a query that only asks to go on with the previous answer
+# ("explain more", "explain in 50 words", "why?"), with no topic of its own
+BARE_FOLLOW_UP_WORDS = frozenset(
+    """
+    a about again an and another answer bullet bullets briefly can clarify
+    continue could detail detailed details do elaborate example examples
+    explain expand further give go how i in into it its list me more on
+    please point points pointwise short shorter simple simpler simply step
+    steps summarize summary tell that the these this those to what why with
+    word words you
+    """.split()
+)
+
+
+def has_context(turn: dict) -> bool:
+    return bool(turn.get("context_ids"))
+
+
+# Most recent turns of a session that were answered from retrieved context,
+# newest first, including a turn still buffered by the history writer
+async def recent_session_turns(history_collection, session_id, limit: int) -> list:
+    if not session_id:
+        return []
+    turns = []
+    pending = history_writer.pending_turn(session_id)
+    if pending is not None and has_context(pending):
+        turns.append(pending)
+    cursor = history_collection.find(
+        {"session_id": session_id, **CONTEXT_TURN},
+        {"context_ids": 1, "query_embedding": 1, "response_embedding": 1},
+        sort=[("_id", -1)],
+        limit=limit,
+    )
+    for turn in await cursor.to_list(length=limit):
+        # A buffered turn may be written while it is being read
+        if all(turn["_id"] != other.get("_id") for other in turns):
+            turns.append(turn)
+    return turns[:limit]
+
+
+# Highest cosine similarity of a query to a turn's query or answer, -1 when
+# the turn has neither embedding
+def follow_up_score(turn: dict, query_embedding) -> float:
+    query = np.asarray(query_embedding, dtype=np.float32).reshape(-1)
+    scores = [-1.0]
+    for field in ("query_embedding", "response_embedding"):
+        if turn.get(field) is None:
+            continue
+        embedding = decode_embedding(turn[field])
+        norms = np.linalg.norm(query) * np.linalg.norm(embedding)
+        if norms:
+            scores.append(float(query @ embedding) / norms)
+    return max(scores)
+
+
+def is_bare_follow_up(query: str) -> bool:
+    words = re.findall(r"[a-z']+", query.lower())
+    return bool(words) and all(word in BARE_FOLLOW_UP_WORDS for word in words)
+
+
+# The turn a query that retrieved nothing follows up on, None when it is not
+# a follow-up: the recent turn closest to it when one reaches `threshold`.
+# A bare follow-up ("explain more") resembles nothing, so it gets the latest
+# turn once it reaches the lower `bare_threshold`. The embeddings were stored
+# with the turns, so deciding costs no embedding or provider call.
+def follow_up_turn(
+    turns: list, query: str, query_embedding, threshold: float, bare_threshold: float
+):
+    if not turns:
+        return None
+    scores = [follow_up_score(turn, query_embedding) for turn in turns]
+    best = max(range(len(turns)), key=scores.__getitem__)
+    if scores[best] >= threshold:
+        return turns[best]
+    if is_bare_follow_up(query) and scores[0] >= bare_threshold:
+        return turns[0]
+    return None
@@ -0,0 +1,94 @@
+import functools
+import os
+import zipfile
+from collections import deque
+from xml.etree.ElementTree import iterparse
+from models import chunker
+
+# WordprocessingML namespace of the paragraph and text elements of a .docx
+WORD_NAMESPACE = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+
+
+# Readers of the documents a parse worker is working on, reopened only when
+# the file changes
+@functools.lru_cache(maxsize=4)
+def open_pdf(path: str, modified: float):
+    from pypdf import PdfReader
+
+    return PdfReader(path)
+
+
+# Chunks of a page or block of a document, cut on sentence boundaries
+def split_text(text: str, chunk_size: int, chunk_overlap: int) -> list:
+    return chunker.split_text(text, chunk_size, chunk_overlap, sentences=True)
+
+
+def pdf_page_count(path: str) -> int:
+    return len(open_pdf(path, os.path.getmtime(path)).pages)
+
+
+# Runs in a parse worker process: extract one page and split it into chunks
+def pdf_page_chunks(path: str, page: int, chunk_size: int, chunk_overlap: int):
+    reader = open_pdf(path, os.path.getmtime(path))
+    return split_text(
+        reader.pages[page].extract_text() or "", chunk_size, chunk_overlap
+    )
+
+
+# Chunks of every PDF page, in page order. Pages are extracted in parallel on
+# the process pool with at most `pages_in_flight` submitted at a time, so
+# memory stays bounded whatever the page count.
+def iter_pdf_chunks(
+    path: str, executor, pages_in_flight: int, chunk_size: int, chunk_overlap: int
+):
+    pages = iter(range(pdf_page_count(path)))
+    futures = deque()
+    try:
+        for page in pages:
+            futures.append(
+                executor.submit(pdf_page_chunks, path, page, chunk_size, chunk_overlap)
+            )
+            if len(futures) >= max(1, pages_in_flight):
+                yield futures.popleft().result()
+        while futures:
+            yield futures.popleft().result()
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+# Text of a .docx streamed paragraph by paragraph out of word/document.xml,
+# in blocks of `block_chars` characters that end on a paragraph boundary.
+# A .docx has no stored pages, so the blocks stand in for them.
+def iter_docx_blocks(path: str, block_chars: int):
+    paragraphs, size = [], 0
+    with zipfile.ZipFile(path) as archive, archive.open("word/document.xml") as xml:
+        for _, element in iterparse(xml):
+            if element.tag != WORD_NAMESPACE + "p":
+                continue
+            text = "".join(
+                node.text or "" for node in element.iter(WORD_NAMESPACE + "t")
+            )
+            element.clear()
+            paragraphs.append(text)
+            size += len(text)
+            if size >= block_chars:
+                yield "\n\n".join(paragraphs)
+                paragraphs, size = [], 0
+    if paragraphs:
+        yield "\n\n".join(paragraphs)
+
+
+# Text of a plain text file in blocks of `block_chars` characters that end on
+# a line boundary
+def iter_text_blocks(path: str, block_chars: int):
+    lines, size = [], 0
+    with open(path, encoding="utf-8", errors="replace") as file:
+        for line in file:
+            lines.append(line)
+            size += len(line)
+            if size >= block_chars:
+                yield "".join(lines)
+                lines, size = [], 0
+    if lines:
+        yield "".join(lines)
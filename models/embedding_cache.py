@@ -0,0 +1,203 @@
+import asyncio
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from config.executors import io_executor, run_in_executor
+from config.metrics import metrics
+from config.settings import settings
+from models.embedding_models import embedding_models
+from models.embedding_scheduler import embedding_scheduler
+
+# Keys looked up per SQLite query, below its bound-parameter limit
+DISK_LOOKUP_BATCH = 500
+# Share of disk_size inserted between two counts of the SQLite rows, and
+# pruned below disk_size at once so a full file is not pruned on every insert
+DISK_PRUNE_SLACK = 0.1
+
+
+# Same text up to Unicode form and whitespace embeds to the same vector
+def normalize_text(text: str) -> str:
+    return re.sub(r"\s+", " ", unicodedata.normalize("NFC", text)).strip()
+
+
+# Content-addressed embedding cache keyed by (model name, hash of the
+# normalized text): a bounded in-memory LRU tier in front of a SQLite file
+# that survives restarts and is shared by every worker. The SQLite tier keeps
+# the disk_size most recently used embeddings (0: unbounded).
+class EmbeddingCache:
+    def __init__(self, path: str = None, memory_size: int = 20000, disk_size: int = 0):
+        self.path = path
+        self.memory_size = memory_size
+        self.disk_size = disk_size
+        self.lock = threading.Lock()
+        self.memory = OrderedDict()
+        self.connection = None
+        # Rows inserted since the SQLite rows were last counted
+        self.unpruned = 0
+        self.hits = 0
+        self.misses = 0
+
+    def key(self, model_name: str, text: str) -> bytes:
+        payload = f"{model_name}\0{normalize_text(text)}".encode("utf-8")
+        return hashlib.sha256(payload).digest()
+
+    def disk(self):
+        if self.connection is None and self.path:
+            connection = sqlite3.connect(self.path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS embeddings "
+                "(key BLOB PRIMARY KEY, embedding BLOB NOT NULL, "
+                "used REAL NOT NULL DEFAULT 0)"
+            )
+            # Files written before the tier was bounded have no last-use time
+            columns = [
+                row[1] for row in connection.execute("PRAGMA table_info(embeddings)")
+            ]
+            if "used" not in columns:
+                connection.execute(
+                    "ALTER TABLE embeddings ADD COLUMN used REAL NOT NULL DEFAULT 0"
+                )
+            connection.execute(
+                "CREATE INDEX IF NOT EXISTS embeddings_used ON embeddings (used)"
+            )
+            connection.commit()
+            self.connection = connection
+            self.unpruned = self.disk_size
+        return self.connection
+
+    # Delete the least recently used rows once the file outgrows disk_size.
+    # Other workers insert too, so the rows are counted again after every
+    # DISK_PRUNE_SLACK share of disk_size inserted here.
+    def prune(self, connection) -> None:
+        if not self.disk_size or self.unpruned < self.disk_size * DISK_PRUNE_SLACK:
+            return None
+        self.unpruned = 0
+        (rows,) = connection.execute("SELECT COUNT(*) FROM embeddings").fetchone()
+        excess = rows - int(self.disk_size * (1 - DISK_PRUNE_SLACK))
+        if rows > self.disk_size and excess > 0:
+            connection.execute(
+                "DELETE FROM embeddings WHERE key IN "
+                "(SELECT key FROM embeddings ORDER BY used LIMIT ?)",
+                (excess,),
+            )
+            connection.commit()
+            metrics.increment("embedding_cache_pruned", excess)
+        return None
+
+    def remember(self, key: bytes, embedding: np.ndarray) -> None:
+        self.memory[key] = embedding
+        self.memory.move_to_end(key)
+        while len(self.memory) > self.memory_size:
+            self.memory.popitem(last=False)
+        return None
+
+    # Cached embeddings of the keys found in either tier
+    def get_many(self, keys: list) -> dict:
+        found = {}
+        with self.lock:
+            for key in keys:
+                if key in self.memory:
+                    self.memory.move_to_end(key)
+                    found[key] = self.memory[key]
+            missing = [key for key in dict.fromkeys(keys) if key not in found]
+            connection = self.disk() if missing else None
+            loaded = []
+            for start in range(0, len(missing) if connection else 0, DISK_LOOKUP_BATCH):
+                batch = missing[start : start + DISK_LOOKUP_BATCH]
+                rows = connection.execute(
+                    "SELECT key, embedding FROM embeddings WHERE key IN (%s)"
+                    % ",".join("?" * len(batch)),
+                    batch,
+                ).fetchall()
+                for key, blob in rows:
+                    embedding = np.frombuffer(blob, dtype="<f4")
+                    found[key] = embedding
+                    self.remember(key, embedding)
+                    loaded.append(key)
+            if loaded and self.disk_size:
+                used = time.time()
+                connection.executemany(
+                    "UPDATE embeddings SET used = ? WHERE key = ?",
+                    [(used, key) for key in loaded],
+                )
+                connection.commit()
+        return found
+
+    def put_many(self, items: dict) -> None:
+        with self.lock:
+            for key, embedding in items.items():
+                self.remember(key, embedding)
+            connection = self.disk()
+            if connection is not None:
+                used = time.time()
+                cursor = connection.executemany(
+                    "INSERT OR IGNORE INTO embeddings (key, embedding, used) "
+                    "VALUES (?, ?, ?)",
+                    [
+                        (key, embedding.tobytes(), used)
+                        for key, embedding in items.items()
+                    ],
+                )
+                connection.commit()
+                self.unpruned += max(cursor.rowcount, 0)
+                self.prune(connection)
+        return None
+
+    def record(self, hits: int, misses: int) -> None:
+        metrics.increment("embedding_cache_hits", hits)
+        metrics.increment("embedding_cache_misses", misses)
+        with self.lock:
+            self.hits += hits
+            self.misses += misses
+            ratio = self.hits / (self.hits + self.misses)
+        metrics.set_gauge("embedding_cache_hit_ratio", ratio)
+        return None
+
+    # Embeddings of the texts in order; only texts not cached yet are embedded,
+    # in one batch through embed_batch (the shared model by default)
+    def embed_documents(self, texts: list, embed_batch=None, model_name=None):
+        if not texts:
+            return []
+        model_name = model_name or embedding_models.default_model_name
+        if embed_batch is None:
+            embed_batch = embedding_models.get(model_name).embed_documents
+        keys = [self.key(model_name, text) for text in texts]
+        found = self.get_many(keys)
+        missing = {key: text for key, text in zip(keys, texts) if key not in found}
+        if missing:
+            embeddings = embed_batch(list(missing.values()))
+            computed = {
+                key: np.asarray(embedding, dtype="<f4")
+                for key, embedding in zip(missing, embeddings)
+            }
+            self.put_many(computed)
+            found.update(computed)
+        self.record(len(texts) - len(missing), len(missing))
+        return [found[key] for key in keys]
+
+    # Non-blocking query embedding: tier lookups run on the I/O executor and
+    # a miss is computed by the micro-batching scheduler
+    async def embed_query(self, text: str) -> np.ndarray:
+        key = self.key(embedding_models.default_model_name, text)
+        found = await run_in_executor(io_executor, self.get_many, [key])
+        if key in found:
+            self.record(1, 0)
+            return found[key]
+        embedding = await asyncio.wrap_future(embedding_scheduler.submit(text))
+        embedding = np.asarray(embedding, dtype="<f4")
+        await run_in_executor(io_executor, self.put_many, {key: embedding})
+        self.record(0, 1)
+        return embedding
+
+
+embedding_cache = EmbeddingCache(
+    settings.embedding_cache_path,
+    settings.embedding_cache_size,
+    settings.embedding_cache_disk_size,
+)
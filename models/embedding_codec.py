@@ -0,0 +1,25 @@
+import numpy as np
+from bson.binary import Binary
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+# Read documents as raw BSON so that fields are only decoded when accessed
+RAW_BSON_OPTIONS = CodecOptions(document_class=RawBSONDocument)
+
+
+# Pack an embedding as little-endian float32 bytes stored as BSON Binary
+def encode_embedding(embedding) -> Binary:
+    return Binary(np.asarray(embedding, dtype="<f4").tobytes())
+
+
+# View a stored embedding as a float32 array. Binary values are wrapped with
+# frombuffer without copying; legacy arrays of BSON doubles are still accepted.
+def decode_embedding(value) -> np.ndarray:
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return np.frombuffer(value, dtype="<f4")
+    return np.asarray(value, dtype=np.float32)
+
+
+# The collection with a raw BSON codec for bulk embedding reads
+def raw_collection(collection):
+    return collection.with_options(codec_options=RAW_BSON_OPTIONS)
@@ -0,0 +1,36 @@
+import threading
+from config.settings import settings
+from langchain_community.embeddings.sentence_transformer import (
+    SentenceTransformerEmbeddings,
+)
+
+
+# Embedding models loaded once per process and shared by every pipeline.
+# "ready" stays False until the startup warm-up has loaded the models.
+class EmbeddingModelRegistry:
+    def __init__(self, default_model_name: str):
+        self.default_model_name = default_model_name
+        self.lock = threading.Lock()
+        self.models = {}
+        self.ready = False
+
+    def get(self, model_name: str = None):
+        model_name = model_name or self.default_model_name
+        model = self.models.get(model_name)
+        if model is None:
+            with self.lock:
+                model = self.models.get(model_name)
+                if model is None:
+                    model = SentenceTransformerEmbeddings(model_name=model_name)
+                    self.models[model_name] = model
+        return model
+
+    # Load the models and run a dummy batch so the first request is not slow
+    def warm_up(self, model_names: list = None) -> None:
+        for model_name in model_names or [self.default_model_name]:
+            self.get(model_name).embed_documents(["warm up"])
+        self.ready = True
+        return None
+
+
+embedding_models = EmbeddingModelRegistry(settings.embedding_model_name)
@@ -0,0 +1,94 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from config.metrics import metrics
+from config.settings import settings
+from models.embedding_models import embedding_models
+
+
+# Collects the query embeddings requested concurrently by different requests
+# and runs them as one batched forward pass. A batch is dispatched once it
+# holds max_batch_size texts or max_wait_ms after its first text arrived.
+class EmbeddingScheduler:
+    def __init__(self, embed_batch, max_batch_size: int = 32, max_wait_ms=5.0):
+        self.embed_batch = embed_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max_wait_ms / 1000
+        self.queue = queue.Queue()
+        self.lock = threading.Lock()
+        self.worker = None
+
+    def start(self) -> None:
+        with self.lock:
+            if self.worker is None:
+                self.worker = threading.Thread(
+                    target=self.run, name="embedding-scheduler", daemon=True
+                )
+                self.worker.start()
+        return None
+
+    # Queue a text; the future resolves to its embedding
+    def submit(self, text: str) -> Future:
+        self.start()
+        future = Future()
+        self.queue.put((text, future, time.perf_counter()))
+        return future
+
+    def run(self) -> None:
+        while True:
+            batch = [self.queue.get()]
+            deadline = time.perf_counter() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                try:
+                    batch.append(
+                        self.queue.get(timeout=max(0, deadline - time.perf_counter()))
+                    )
+                except queue.Empty:
+                    break
+            # A failing batch fails its own futures but never ends the thread,
+            # which every later query embedding waits on
+            try:
+                self.process(batch)
+            except Exception as e:
+                metrics.increment("embedding_batch_errors")
+                for _, future, _ in batch:
+                    if not future.done():
+                        future.set_exception(e)
+
+    def process(self, batch: list) -> None:
+        # Drop the texts whose caller gave up (a disconnect or a timeout
+        # cancelled the future); the others can no longer be cancelled
+        batch = [item for item in batch if item[1].set_running_or_notify_cancel()]
+        if not batch:
+            return None
+        started = time.perf_counter()
+        metrics.observe("embedding_batch_size", len(batch))
+        for _, _, queued_at in batch:
+            metrics.observe("embedding_queue_wait_ms", (started - queued_at) * 1000)
+        try:
+            embeddings = self.embed_batch([text for text, _, _ in batch])
+            if len(embeddings) != len(batch):
+                raise ValueError(
+                    f"{len(embeddings)} embeddings returned for {len(batch)} texts"
+                )
+        except Exception as e:
+            metrics.increment("embedding_batch_errors")
+            for _, future, _ in batch:
+                future.set_exception(e)
+            return None
+        metrics.observe("embedding_batch_ms", (time.perf_counter() - started) * 1000)
+        for (_, future, _), embedding in zip(batch, embeddings):
+            future.set_result(embedding)
+        return None
+
+
+def embed_queries(texts: list) -> list:
+    return embedding_models.get().embed_documents(texts)
+
+
+embedding_scheduler = EmbeddingScheduler(
+    embed_queries,
+    max_batch_size=settings.embedding_batch_size,
+    max_wait_ms=settings.embedding_max_wait_ms,
+)
@@ -0,0 +1,140 @@
+import asyncio
+import time
+from config.mongo_db import mongo_db
+from config.metrics import metrics
+from config.settings import settings
+from config.executors import cpu_executor, run_in_executor
+from models.embedding_codec import encode_embedding
+from models.embedding_cache import embedding_cache
+
+# Queued after the last record to stop the writer once the buffer is drained
+STOP = object()
+
+
+# Write-behind queue for RAG_History. Answered turns are buffered in memory and
+# written with insert_many once a batch fills up or the flush interval passes,
+# so a response never waits on a Mongo write. The buffer is bounded: when
+# Mongo falls behind, writers wait for room instead of growing it without
+# limit. Answer embeddings are computed here, one embedding call per batch.
+class HistoryWriter:
+    def __init__(
+        self,
+        history_collection,
+        batch_size: int,
+        flush_interval_ms: float,
+        max_pending: int,
+        max_retries: int,
+    ):
+        self.history_collection = history_collection
+        self.batch_size = max(1, batch_size)
+        self.flush_interval = flush_interval_ms / 1000
+        self.max_retries = max_retries
+        self.queue = asyncio.Queue(maxsize=max_pending)
+        # Latest buffered turn per session, visible to follow-up queries until
+        # it is written
+        self.unflushed = {}
+        self.worker = None
+
+    def start(self) -> None:
+        if self.worker is None:
+            self.worker = asyncio.get_running_loop().create_task(self.run())
+        return None
+
+    # Buffer one history record; waits only while the buffer is full
+    async def write(self, record: dict) -> None:
+        self.start()
+        if record.get("session_id"):
+            self.unflushed[record["session_id"]] = record
+        if self.queue.full():
+            metrics.increment("history_backpressure_waits")
+        await self.queue.put(record)
+        metrics.set_gauge("history_queue_depth", self.queue.qsize())
+        return None
+
+    # Buffered turn of a session that has not been written yet
+    def pending_turn(self, session_id):
+        return self.unflushed.get(session_id)
+
+    # Collect records into batches by size or time and write them
+    async def run(self) -> None:
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            record = await self.queue.get()
+            if record is STOP:
+                break
+            batch = [record]
+            deadline = loop.time() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    record = await asyncio.wait_for(self.queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if record is STOP:
+                    stopping = True
+                    break
+                batch.append(record)
+            metrics.set_gauge("history_queue_depth", self.queue.qsize())
+            await self.flush(batch)
+        return None
+
+    async def embed_responses(self, batch: list) -> None:
+        records = [record for record in batch if "response_embedding" not in record]
+        if not records:
+            return None
+        try:
+            embeddings = await run_in_executor(
+                cpu_executor,
+                embedding_cache.embed_documents,
+                [record["response"] for record in records],
+            )
+        except Exception:
+            # The turn is still worth keeping without its answer embedding
+            metrics.increment("history_embedding_errors")
+            return None
+        for record, embedding in zip(records, embeddings):
+            record["response_embedding"] = encode_embedding(embedding)
+        return None
+
+    # Write one batch, retrying with backoff before the records are dropped
+    async def flush(self, batch: list) -> None:
+        started = time.perf_counter()
+        await self.embed_responses(batch)
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.history_collection.insert_many(batch, ordered=False)
+                break
+            except Exception:
+                metrics.increment("history_write_errors")
+                if attempt == self.max_retries:
+                    metrics.increment("history_records_dropped", len(batch))
+                    break
+                await asyncio.sleep(0.1 * 2**attempt)
+        for record in batch:
+            if self.unflushed.get(record.get("session_id")) is record:
+                del self.unflushed[record["session_id"]]
+        metrics.observe("history_flush_ms", (time.perf_counter() - started) * 1000)
+        metrics.observe("history_flush_size", len(batch))
+        return None
+
+    # Drain the buffer and write everything still pending before shutdown
+    async def close(self) -> None:
+        if self.worker is None:
+            return None
+        await self.queue.put(STOP)
+        await self.worker
+        self.worker = None
+        metrics.set_gauge("history_queue_depth", self.queue.qsize())
+        return None
+
+
+history_writer = HistoryWriter(
+    mongo_db.get_async_database("RAG_DB")["RAG_History"],
+    batch_size=settings.history_batch_size,
+    flush_interval_ms=settings.history_flush_ms,
+    max_pending=settings.history_max_pending,
+    max_retries=settings.history_flush_retries,
+)
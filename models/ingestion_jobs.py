@@ -0,0 +1,343 @@
+import asyncio
+import os
+import socket
+import time
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from bson.errors import InvalidId
+from pymongo import ASCENDING, ReturnDocument
+from config.mongo_db import mongo_db
+from config.metrics import metrics
+from config.settings import settings
+from config.executors import cpu_executor, io_executor, run_in_executor
+from models.ingestion_pipeline import IngestionPipeline
+from models.source_manifest import source_manifests
+from models.read_upload_file import TextProcessor
+from models.scrapping import WebScraper
+
+# Job fields reported by the job-status endpoint
+REPORTED_FIELDS = (
+    "kind",
+    "source",
+    "source_id",
+    "name",
+    "status",
+    "attempts",
+    "progress",
+    "throughput",
+    "errors",
+    "created_at",
+    "started_at",
+    "finished_at",
+)
+
+
+def now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+# Background ingestion jobs persisted in the Ingestion_Jobs collection. The
+# ingestion endpoints only enqueue a job; a pool of workers claims queued jobs
+# and runs them through the ingestion pipeline. A running job holds a lease
+# that its heartbeat renews along with the progress, so a job whose process
+# died is claimed again once the lease expires. Every chunk is stored with
+# its job id and number, and a resumed job skips the chunks already stored.
+# Uploaded files only exist on the host that received them, so their jobs are
+# claimed by that host's workers and the file is removed once the job ends.
+# Only chunks that are new to their source are embedded and stored; see
+# SourceManifests.
+class IngestionJobs:
+    def __init__(
+        self,
+        jobs_collection,
+        docs_collection,
+        concurrency: int,
+        lease_seconds: float,
+        poll_seconds: float,
+        max_attempts: int,
+    ):
+        self.jobs_collection = jobs_collection
+        self.docs_collection = docs_collection
+        self.concurrency = max(1, concurrency)
+        self.lease_seconds = lease_seconds
+        self.poll_seconds = poll_seconds
+        self.max_attempts = max(1, max_attempts)
+        self.host = socket.gethostname()
+        self.wakeup = None
+        self.workers = []
+
+    async def start(self) -> None:
+        if self.workers:
+            return None
+        await self.jobs_collection.create_index(
+            [("status", ASCENDING), ("created_at", ASCENDING)]
+        )
+        await self.docs_collection.create_index(
+            [("job_id", ASCENDING), ("chunk", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"job_id": {"$exists": True}},
+        )
+        self.wakeup = asyncio.Event()
+        self.workers = [
+            asyncio.ensure_future(self.work()) for _ in range(self.concurrency)
+        ]
+        return None
+
+    # Enqueue a file path, uploaded file or website url and return the job id.
+    # `source_id` is stored as the chunks' source and keys the source manifest,
+    # the file path or url by default; `name` is only displayed.
+    async def submit(
+        self, kind: str, source: str, name: str = None, source_id: str = None
+    ) -> str:
+        result = await self.jobs_collection.insert_one(
+            {
+                "kind": kind,
+                "source": source,
+                "source_id": source_id or source,
+                "name": name or source,
+                "host": self.host if kind == "upload" else None,
+                "status": "queued",
+                "attempts": 0,
+                "progress": {
+                    "pages": 0,
+                    "chunks": 0,
+                    "embeddings": 0,
+                    "stored": 0,
+                    "unchanged": 0,
+                    "tombstoned": 0,
+                },
+                "throughput": {},
+                "errors": [],
+                "created_at": now(),
+                "started_at": None,
+                "finished_at": None,
+                "lease_until": None,
+                "retry_at": now(),
+            }
+        )
+        metrics.increment("ingestion_jobs_submitted")
+        if self.wakeup is not None:
+            self.wakeup.set()
+        return str(result.inserted_id)
+
+    # Status of a job, None when the id is unknown
+    async def get(self, job_id: str):
+        try:
+            job = await self.jobs_collection.find_one({"_id": ObjectId(job_id)})
+        except InvalidId:
+            return None
+        if job is None:
+            return None
+        report = {"job_id": str(job["_id"])}
+        for field in REPORTED_FIELDS:
+            value = job.get(field)
+            report[field] = value.isoformat() if isinstance(value, datetime) else value
+        for error in report["errors"] or []:
+            if isinstance(error.get("at"), datetime):
+                error["at"] = error["at"].isoformat()
+        return report
+
+    # Take the oldest queued job that is due, or a running one whose lease
+    # has expired
+    async def claim(self):
+        started = now()
+        return await self.jobs_collection.find_one_and_update(
+            {
+                "$or": [
+                    {"status": "queued", "retry_at": {"$lte": started}},
+                    {"status": "running", "lease_until": {"$lt": started}},
+                ],
+                "host": {"$in": [None, self.host]},
+            },
+            {
+                "$set": {
+                    "status": "running",
+                    "started_at": started,
+                    "lease_until": started + timedelta(seconds=self.lease_seconds),
+                },
+                "$inc": {"attempts": 1},
+            },
+            sort=[("created_at", ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+
+    async def work(self) -> None:
+        while True:
+            self.wakeup.clear()
+            try:
+                job = await self.claim()
+            except Exception:
+                metrics.increment("ingestion_job_claim_errors")
+                job = None
+            if job is None:
+                try:
+                    await asyncio.wait_for(self.wakeup.wait(), self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            # A failure outside the job's own handling (MongoDB unreachable
+            # while recording its outcome) must not end the worker; the
+            # job's lease expires and it is claimed again
+            try:
+                await self.process(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                metrics.increment("ingestion_job_worker_errors")
+
+    # Chunk documents of the job's file or website and the executor to parse on
+    async def open_source(self, job: dict, progress: dict) -> tuple:
+        if job["kind"] in ("file", "upload"):
+            text_processor = TextProcessor(job["source"], source=self.source_id(job))
+            if text_processor.file_format() is None:
+                raise ValueError(
+                    "File format not supported. Please upload pdf, docx or txt file."
+                )
+            return text_processor.extract_text(progress), cpu_executor
+        if job["kind"] == "website":
+            web_scraper = WebScraper(job["source"])
+            if (
+                await run_in_executor(io_executor, web_scraper.is_url_clickable)
+                is not True
+            ):
+                raise ValueError(
+                    "URL is not clickable. Copied it from the browser carefully"
+                )
+            return (
+                web_scraper.extract_documents(asyncio.get_running_loop(), progress),
+                io_executor,
+            )
+        raise ValueError(f"Unknown job kind: {job['kind']}")
+
+    # Jobs queued before source ids existed store their chunks under the
+    # file path or url
+    def source_id(self, job: dict) -> str:
+        return job.get("source_id") or job["source"]
+
+    # Number the chunks of the job and skip those stored by an earlier attempt
+    def numbered(self, job_id, documents, stored: set):
+        for number, document in enumerate(documents):
+            if number not in stored:
+                yield dict(document, job_id=job_id, chunk=number)
+
+    def throughput(self, progress: dict, started: float) -> dict:
+        seconds = time.perf_counter() - started
+        return {
+            "seconds": round(seconds, 3),
+            "pages_per_second": round(progress["pages"] / seconds, 2),
+            "chunks_per_second": round(progress["stored"] / seconds, 2),
+            "embeddings_per_second": round(progress["embeddings"] / seconds, 2),
+        }
+
+    # Persist the progress and renew the lease while the job runs
+    async def heartbeat(self, job_id, progress: dict, started: float) -> None:
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            await self.jobs_collection.update_one(
+                {"_id": job_id},
+                {
+                    "$set": {
+                        "progress": progress,
+                        "throughput": self.throughput(progress, started),
+                        "lease_until": now() + timedelta(seconds=self.lease_seconds),
+                    }
+                },
+            )
+
+    async def process(self, job: dict) -> None:
+        job_id = job["_id"]
+        started = time.perf_counter()
+        progress = {
+            "pages": 0,
+            "chunks": 0,
+            "embeddings": 0,
+            "stored": 0,
+            "unchanged": 0,
+            "tombstoned": 0,
+        }
+        heartbeat = asyncio.ensure_future(self.heartbeat(job_id, progress, started))
+        update = {}
+        try:
+            stored = set(
+                await self.docs_collection.distinct("chunk", {"job_id": job_id})
+            )
+            for name in ("chunks", "embeddings", "stored"):
+                progress[name] = len(stored)
+            if job["attempts"] > self.max_attempts:
+                raise RuntimeError("Job was interrupted too many times")
+            documents, parse_executor = await self.open_source(job, progress)
+            sync = await source_manifests.begin(
+                self.source_id(job),
+                path=job["source"] if job["kind"] in ("file", "upload") else None,
+            )
+            if sync.is_unchanged:
+                progress["unchanged"] = sync.manifest["chunks"]
+            else:
+                await IngestionPipeline(
+                    self.docs_collection,
+                    parse_executor=parse_executor,
+                    progress=progress,
+                ).run(self.numbered(job_id, sync.new_documents(documents), stored))
+                progress["tombstoned"] = await source_manifests.commit(sync)
+                progress["unchanged"] = sync.unchanged
+            update = {"$set": {"status": "completed", "finished_at": now()}}
+            metrics.increment("ingestion_jobs_completed")
+        except asyncio.CancelledError:
+            # Shutting down: hand the job back so the next start resumes it
+            update = {"$set": {"status": "queued", "lease_until": None}}
+            raise
+        except Exception as e:
+            # Retry with exponential backoff until the attempts run out
+            retry = job["attempts"] < self.max_attempts
+            update = {
+                "$set": {
+                    "status": "queued" if retry else "failed",
+                    "lease_until": None,
+                    "retry_at": now()
+                    + timedelta(seconds=self.poll_seconds * 2 ** job["attempts"]),
+                    "finished_at": None if retry else now(),
+                },
+                "$push": {
+                    "errors": {
+                        "message": str(e),
+                        "attempt": job["attempts"],
+                        "at": now(),
+                    }
+                },
+            }
+            metrics.increment("ingestion_jobs_failed")
+        finally:
+            heartbeat.cancel()
+            update.setdefault("$set", {})
+            update["$set"]["progress"] = progress
+            update["$set"]["throughput"] = self.throughput(progress, started)
+            await asyncio.shield(
+                self.jobs_collection.update_one({"_id": job_id}, update)
+            )
+            if job["kind"] == "upload" and update["$set"]["status"] != "queued":
+                await run_in_executor(io_executor, self.remove_upload, job["source"])
+        return None
+
+    def remove_upload(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        return None
+
+    async def close(self) -> None:
+        for worker in self.workers:
+            worker.cancel()
+        await asyncio.gather(*self.workers, return_exceptions=True)
+        self.workers = []
+        return None
+
+
+ingestion_jobs = IngestionJobs(
+    mongo_db.get_async_database("RAG_DB")["Ingestion_Jobs"],
+    mongo_db.get_async_database("RAG_DB")["Upload_Docs"],
+    concurrency=settings.job_workers,
+    lease_seconds=settings.job_lease_seconds,
+    poll_seconds=settings.job_poll_seconds,
+    max_attempts=settings.job_max_attempts,
+)
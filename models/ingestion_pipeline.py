@@ -0,0 +1,188 @@
+import asyncio
+import itertools
+import time
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+from config.metrics import metrics
+from config.settings import settings
+from config.executors import cpu_executor, run_in_executor
+from models.vector_index import vector_index
+from models.lexical_index import lexical_index
+from models.embedding_codec import encode_embedding
+from models.embedding_cache import embedding_cache
+from models.search_filter import source_name
+
+# Marks the end of a stage's output
+DONE = object()
+
+# MongoDB error code of a unique index violation
+DUPLICATE_KEY = 11000
+
+
+# Staged ingestion: parse -> chunk -> embed in batches -> unordered insert_many.
+# The parse stage pulls chunk documents from a blocking generator, a batch at a
+# time, on an executor; embed workers embed each batch and insert workers write
+# it and add it to the resident indexes. Stages run concurrently, joined by
+# bounded queues, so parsing, embedding and writing overlap and only a few
+# batches are held in memory at once.
+class IngestionPipeline:
+    def __init__(
+        self,
+        docs_collection,
+        batch_size: int = None,
+        queue_batches: int = None,
+        embed_workers: int = None,
+        insert_workers: int = None,
+        parse_executor=cpu_executor,
+        embed_documents=None,
+        update_indexes: bool = True,
+        progress: dict = None,
+        on_batch=None,
+    ):
+        self.docs_collection = docs_collection
+        self.batch_size = max(1, batch_size or settings.ingest_batch_size)
+        self.queue_batches = max(1, queue_batches or settings.ingest_queue_batches)
+        self.embed_workers = max(1, embed_workers or settings.ingest_embed_workers)
+        self.insert_workers = max(1, insert_workers or settings.ingest_insert_workers)
+        self.parse_executor = parse_executor
+        self.embed_documents = embed_documents or embedding_cache.embed_documents
+        self.update_indexes = update_indexes
+        # Chunks parsed, embedded and stored so far, shared with the caller
+        self.progress = progress if progress is not None else {}
+        # Awaited with (batch, inserted documents, embeddings) after each write
+        self.on_batch = on_batch
+        self.embedders_running = self.embed_workers
+        self.chunks = 0
+        self.batches = 0
+
+    def count(self, name: str, value: int) -> None:
+        self.progress[name] = self.progress.get(name, 0) + value
+        return None
+
+    # Documents are dicts of the stored fields with their chunk under "text"
+    async def parse(self, documents, parsed: asyncio.Queue) -> None:
+        iterator = iter(documents)
+        while True:
+            batch = await run_in_executor(
+                self.parse_executor,
+                lambda: list(itertools.islice(iterator, self.batch_size)),
+            )
+            if not batch:
+                break
+            self.count("chunks", len(batch))
+            await parsed.put(batch)
+        for _ in range(self.embed_workers):
+            await parsed.put(DONE)
+        return None
+
+    async def embed(self, parsed: asyncio.Queue, embedded: asyncio.Queue) -> None:
+        while True:
+            batch = await parsed.get()
+            if batch is DONE:
+                break
+            started = time.perf_counter()
+            embeddings = await run_in_executor(
+                cpu_executor,
+                self.embed_documents,
+                [document["text"] for document in batch],
+            )
+            metrics.observe("ingest_embed_ms", (time.perf_counter() - started) * 1000)
+            self.count("embeddings", len(batch))
+            await embedded.put((batch, embeddings))
+        # The last embed worker to finish ends the insert stage
+        self.embedders_running -= 1
+        if not self.embedders_running:
+            for _ in range(self.insert_workers):
+                await embedded.put(DONE)
+        return None
+
+    async def insert(self, embedded: asyncio.Queue) -> None:
+        while True:
+            item = await embedded.get()
+            if item is DONE:
+                break
+            batch, embeddings = item
+            started = time.perf_counter()
+            inserted = await self.insert_batch(batch, embeddings)
+            metrics.observe("ingest_insert_ms", (time.perf_counter() - started) * 1000)
+            if self.update_indexes and inserted:
+                await self.add_to_indexes(
+                    [document["_id"] for document in inserted],
+                    inserted,
+                    [embeddings[document["row"]] for document in inserted],
+                )
+            self.chunks += len(inserted)
+            self.batches += 1
+            self.count("stored", len(inserted))
+            metrics.increment("ingest_chunks", len(inserted))
+            if self.on_batch is not None:
+                await self.on_batch(batch, inserted, embeddings)
+        return None
+
+    # Write a batch and return its inserted documents. Chunks already stored
+    # (a duplicate key on the per-source content hash or the job's chunk
+    # number) are skipped rather than failing the batch. The ids are assigned
+    # here, as the driver would, so they are known whatever the write returns.
+    async def insert_batch(self, batch: list, embeddings) -> list:
+        documents = [
+            dict(document, _id=ObjectId(), embedding=encode_embedding(embedding))
+            for document, embedding in zip(batch, embeddings)
+        ]
+        try:
+            await self.docs_collection.insert_many(documents, ordered=False)
+            failed = set()
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error["code"] != DUPLICATE_KEY for error in errors):
+                raise
+            failed = {error["index"] for error in errors}
+            metrics.increment("ingest_chunks_duplicate", len(failed))
+        return [
+            dict(batch[row], _id=document["_id"], row=row)
+            for row, document in enumerate(documents)
+            if row not in failed
+        ]
+
+    async def add_to_indexes(self, inserted_ids, batch, embeddings) -> None:
+        sources = [
+            source_name(document.get("source"), document.get("url"))
+            for document in batch
+        ]
+        await run_in_executor(
+            cpu_executor, vector_index.add, inserted_ids, embeddings, sources=sources
+        )
+        await run_in_executor(
+            cpu_executor,
+            lexical_index.add,
+            inserted_ids,
+            [document["text"] for document in batch],
+            sources=sources,
+        )
+        return None
+
+    # Run every stage to completion; the first failure cancels the others
+    async def run(self, documents) -> dict:
+        started = time.perf_counter()
+        parsed = asyncio.Queue(maxsize=self.queue_batches)
+        embedded = asyncio.Queue(maxsize=self.queue_batches)
+        stages = [asyncio.ensure_future(self.parse(documents, parsed))]
+        stages += [
+            asyncio.ensure_future(self.embed(parsed, embedded))
+            for _ in range(self.embed_workers)
+        ]
+        stages += [
+            asyncio.ensure_future(self.insert(embedded))
+            for _ in range(self.insert_workers)
+        ]
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+        seconds = time.perf_counter() - started
+        return {
+            "chunks": self.chunks,
+            "batches": self.batches,
+            "seconds": round(seconds, 3),
+            "chunks_per_second": round(self.chunks / seconds, 1) if seconds else 0.0,
+        }
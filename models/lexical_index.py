@@ -0,0 +1,259 @@
+import re
+import threading
+import numpy as np
+from array import array
+from collections import Counter
+from bson import ObjectId
+from models.embedding_codec import raw_collection
+from models.search_filter import (
+    METADATA_DTYPE,
+    BlockMetadata,
+    make_metadata,
+    remap_sources,
+    source_name,
+)
+
+# Words, numbers and codes such as "SKU-1042" or "v2.1" are single terms
+TOKEN_PATTERN = re.compile(r"\w+(?:[-.]\w+)*")
+
+# Frequent English words ignored in queries so they cannot match on their own
+STOPWORDS = frozenset(
+    "a an and are as at be but by can do does for from has have how i in is it "
+    "its me my no not of on or our so than that the their them then there these "
+    "they this to was we what when where which who why will with you your".split()
+)
+
+
+# Compact in-process inverted index over the chunk text, scored with BM25.
+# Terms map to integer ids; each term keeps postings arrays of document
+# numbers and term frequencies that are appended to as chunks are ingested.
+class LexicalIndex:
+    def __init__(self, k1: float = 1.2, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.lock = threading.Lock()
+        # Serializes loading and syncing, which query threads run on demand
+        self.sync_lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        self.term_ids = {}
+        self.postings = []
+        self.frequencies = []
+        self.ids = np.empty(0, dtype="V12")
+        self.lengths = np.empty(0, dtype=np.int32)
+        self.records = np.empty(0, dtype=METADATA_DTYPE)
+        self.sources, self.source_codes = [], {}
+        self.metadata = None
+        self.row_of = {}
+        self.size = 0
+        self.total_length = 0
+        self.synced_segments = set()
+        self.removed = np.zeros(0, dtype=bool)
+        self.tombstone_version = 0
+        self.loaded = False
+        return None
+
+    def tokenize(self, text: str) -> list:
+        return TOKEN_PATTERN.findall(text.lower())
+
+    # Grow the per-document arrays geometrically
+    def reserve(self, capacity: int) -> None:
+        if capacity <= len(self.ids):
+            return None
+        capacity = max(capacity, 2 * len(self.ids), 1024)
+        for name in ("ids", "lengths", "records", "removed"):
+            grown = np.empty(capacity, dtype=getattr(self, name).dtype)
+            grown[: self.size] = getattr(self, name)[: self.size]
+            setattr(self, name, grown)
+        return None
+
+    # Index the text of newly inserted chunks; already indexed ids are skipped
+    def add(self, ids: list, texts: list, sources=None, statuses=None) -> None:
+        binary_ids = [ObjectId(doc_id).binary for doc_id in ids]
+        fresh = [
+            row for row, doc_id in enumerate(binary_ids) if doc_id not in self.row_of
+        ]
+        if not fresh:
+            return None
+        binary_ids = np.array([binary_ids[row] for row in fresh], dtype="V12")
+        metadata = make_metadata(
+            binary_ids,
+            [sources[row] for row in fresh] if sources is not None else None,
+            [statuses[row] for row in fresh] if statuses is not None else None,
+        )
+        term_counts = [Counter(self.tokenize(texts[row])) for row in fresh]
+
+        with self.lock:
+            # Another thread may have indexed some of them since the check
+            # above; a second copy would outlive the first one's removal
+            keep, seen = [], set()
+            for offset, doc_id in enumerate(binary_ids):
+                doc_id = doc_id.tobytes()
+                if doc_id not in self.row_of and doc_id not in seen:
+                    keep.append(offset)
+                    seen.add(doc_id)
+            if not keep:
+                return None
+            binary_ids = binary_ids[keep]
+            term_counts = [term_counts[offset] for offset in keep]
+            records = remap_sources(metadata, self.sources, self.source_codes)[keep]
+            self.reserve(self.size + len(keep))
+            for offset, counts in enumerate(term_counts):
+                doc = self.size + offset
+                self.row_of[binary_ids[offset].tobytes()] = doc
+                length = sum(counts.values())
+                self.lengths[doc] = length
+                self.total_length += length
+                for term, frequency in counts.items():
+                    term_id = self.term_ids.get(term)
+                    if term_id is None:
+                        term_id = self.term_ids[term] = len(self.postings)
+                        self.postings.append(array("i"))
+                        self.frequencies.append(array("i"))
+                    self.postings[term_id].append(doc)
+                    self.frequencies[term_id].append(frequency)
+            end = self.size + len(keep)
+            self.ids[self.size : end] = binary_ids
+            self.removed[self.size : end] = False
+            self.records[self.size : end] = records
+            self.size = end
+            self.metadata = None
+        return None
+
+    # Index the text of every chunk already stored in MongoDB
+    def load_from_mongodb(self, docs_collection, batch_size: int = 1000) -> None:
+        with self.sync_lock:
+            with self.lock:
+                self.reset()
+            cursor = raw_collection(docs_collection).find(
+                {"status": {"$ne": 0}},
+                {"text": 1, "source": 1, "url": 1, "status": 1},
+                batch_size=batch_size,
+            )
+            self.add_documents(cursor, batch_size)
+            self.loaded = True
+        return None
+
+    def add_documents(self, documents, batch_size: int) -> None:
+        batch = ([], [], [], [])
+        for doc in documents:
+            if not doc.get("text"):
+                continue
+            batch[0].append(doc["_id"])
+            batch[1].append(doc["text"])
+            batch[2].append(source_name(doc.get("source"), doc.get("url")))
+            batch[3].append(doc.get("status"))
+            if len(batch[0]) >= batch_size:
+                self.add(*batch)
+                batch = ([], [], [], [])
+        self.add(*batch)
+        return None
+
+    # Index the chunks other workers appended to the shared vector segments;
+    # only their ids are on disk, so the text is fetched from MongoDB
+    def sync(self, segments: dict, docs_collection, batch_size: int = 1000) -> None:
+        if not set(segments) - self.synced_segments:
+            return None
+        with self.sync_lock:
+            self.sync_segments(segments, docs_collection, batch_size)
+        return None
+
+    def sync_segments(self, segments: dict, docs_collection, batch_size: int) -> None:
+        new_segments = set(segments) - self.synced_segments
+        if not new_segments:
+            return None
+        missing = [
+            ObjectId(doc_id.tobytes())
+            for name in new_segments
+            for doc_id in segments[name][0]
+            if doc_id.tobytes() not in self.row_of
+        ]
+        for start in range(0, len(missing), batch_size):
+            cursor = raw_collection(docs_collection).find(
+                {
+                    "_id": {"$in": missing[start : start + batch_size]},
+                    "status": {"$ne": 0},
+                },
+                {"text": 1, "source": 1, "url": 1, "status": 1},
+            )
+            self.add_documents(cursor, batch_size)
+        self.synced_segments = set(segments)
+        return None
+
+    # Stop matching removed chunks; their postings stay and score zero
+    def remove(self, ids: list) -> None:
+        with self.lock:
+            for doc_id in ids:
+                row = self.row_of.get(ObjectId(doc_id).binary)
+                if row is not None:
+                    self.removed[row] = True
+            self.metadata = None
+        return None
+
+    # Apply the tombstones of the vector index, which other workers share
+    # through the segment store
+    def sync_tombstones(self, tombstones: set, version: int) -> None:
+        if version == self.tombstone_version:
+            return None
+        with self.sync_lock:
+            if version != self.tombstone_version:
+                self.remove(list(tombstones))
+                self.tombstone_version = version
+        return None
+
+    # BM25 top-k, restricted to the documents allowed by the search filter
+    def search(self, query: str, top_k: int = 10, search_filter=None) -> list:
+        terms = {term for term in self.tokenize(query) if term not in STOPWORDS}
+        with self.lock:
+            size = self.size
+            if size == 0 or top_k <= 0:
+                return []
+            if self.metadata is None:
+                self.metadata = BlockMetadata(list(self.sources), self.records[:size])
+            metadata, ids, lengths = self.metadata, self.ids, self.lengths[:size]
+            removed = self.removed[:size].copy()
+            average_length = self.total_length / size
+            matches = [
+                (
+                    np.frombuffer(self.postings[term_id], dtype=np.int32).copy(),
+                    np.frombuffer(self.frequencies[term_id], dtype=np.int32).copy(),
+                )
+                for term_id in (self.term_ids.get(term) for term in terms)
+                if term_id is not None
+            ]
+        if not matches:
+            return []
+
+        scores = np.zeros(size, dtype=np.float32)
+        norms = self.k1 * (1 - self.b + self.b * lengths / average_length)
+        for docs, frequencies in matches:
+            idf = np.log(1 + (size - len(docs) + 0.5) / (len(docs) + 0.5))
+            scores[docs] += (
+                idf * frequencies * (self.k1 + 1) / (frequencies + norms[docs])
+            )
+        scores[removed] = 0
+        if search_filter is not None and not search_filter.is_empty:
+            allowed = metadata.allowed_rows(search_filter)
+            if allowed is not None:
+                mask = np.zeros(size, dtype=bool)
+                mask[allowed] = True
+                scores[~mask] = 0
+
+        rows = np.flatnonzero(scores)
+        if top_k < len(rows):
+            rows = rows[np.argpartition(scores[rows], -top_k)[-top_k:]]
+        rows = rows[np.argsort(scores[rows])[::-1]]
+        return [(ObjectId(ids[row].tobytes()), float(scores[row])) for row in rows]
+
+
+# Fuse several rankings: each document scores the sum of 1 / (k + rank)
+def reciprocal_rank_fusion(rankings: list, k: int = 60) -> list:
+    fused = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            fused[doc_id] = fused.get(doc_id, 0.0) + 1.0 / (k + rank)
+    return sorted(fused, key=fused.get, reverse=True)
+
+
+lexical_index = LexicalIndex()
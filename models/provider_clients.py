@@ -0,0 +1,125 @@
+import asyncio
+import os
+import time
+import httpx
+import google.generativeai as genai
+from contextlib import asynccontextmanager
+from openai import AsyncOpenAI, DefaultAsyncHttpxClient
+from config.metrics import metrics
+from config.settings import settings
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Hugging Face serves the chat models behind an OpenAI-compatible endpoint
+LLAMA_BASE_URL = "https://api-inference.huggingface.co/models/{model}/v1/"
+
+
+# Token bucket that queues callers instead of failing them: tokens refill at
+# `rate` per second up to `burst`, and waiters are served in arrival order
+class TokenBucket:
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.capacity = max(1, burst)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        if self.rate <= 0:
+            return None
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(
+                    self.capacity, self.tokens + (now - self.updated) * self.rate
+                )
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return None
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+# Long-lived client of one LLM provider, created once per process, with a cap
+# on concurrent calls and a request rate limit. Calls wait in `slot()` for a
+# free slot and a rate token before reaching the provider.
+class ProviderPool:
+    def __init__(self, name: str, create_client, limits: dict):
+        self.name = name
+        self.create_client = create_client
+        self.client = None
+        self.semaphore = asyncio.Semaphore(limits["max_concurrency"])
+        self.bucket = TokenBucket(limits["rate_limit"], limits["rate_burst"])
+        self.in_flight = 0
+
+    def get_client(self):
+        if self.client is None:
+            self.client = self.create_client()
+        return self.client
+
+    @asynccontextmanager
+    async def slot(self):
+        queued_at = time.perf_counter()
+        async with self.semaphore:
+            await self.bucket.acquire()
+            metrics.observe(
+                f"{self.name}_queue_wait_ms", (time.perf_counter() - queued_at) * 1000
+            )
+            self.in_flight += 1
+            metrics.set_gauge(f"{self.name}_in_flight", self.in_flight)
+            try:
+                yield self.get_client()
+            finally:
+                self.in_flight -= 1
+                metrics.set_gauge(f"{self.name}_in_flight", self.in_flight)
+
+    async def close(self) -> None:
+        if self.client is not None and hasattr(self.client, "close"):
+            await self.client.close()
+        self.client = None
+        return None
+
+
+# Keep-alive HTTP connections shared by every call to the provider
+def http_client(limits: dict):
+    return DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=limits["max_connections"],
+            max_keepalive_connections=limits["max_connections"],
+        )
+    )
+
+
+def create_openai_client():
+    return AsyncOpenAI(
+        api_key=os.getenv("CHATGPT_API_KEY"),
+        http_client=http_client(settings.provider_limits["openai"]),
+    )
+
+
+# The Gemini SDK keeps one multiplexed gRPC channel once configured
+def create_gemini_client():
+    genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+    return genai
+
+
+def create_llama_client():
+    return AsyncOpenAI(
+        base_url=LLAMA_BASE_URL.format(model=settings.llama_model_name),
+        api_key=os.getenv("LLAMA_MODEL_API_KEY"),
+        http_client=http_client(settings.provider_limits["llama"]),
+    )
+
+
+provider_pools = {
+    "openai": ProviderPool(
+        "openai", create_openai_client, settings.provider_limits["openai"]
+    ),
+    "gemini": ProviderPool(
+        "gemini", create_gemini_client, settings.provider_limits["gemini"]
+    ),
+    "llama": ProviderPool(
+        "llama", create_llama_client, settings.provider_limits["llama"]
+    ),
+}
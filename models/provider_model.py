@@ -0,0 +1,191 @@
+import time
+from models.vector_index import vector_index
+from models.retrieval import find_similar_document_ids
+from models.context_packing import pack_context
+from models.streaming import sse_event, stream_answer
+from config.executors import cpu_executor, run_in_executor
+from models.conversation_memory import recent_session_turns, follow_up_turn
+from models.embedding_codec import encode_embedding
+from models.history_writer import history_writer
+from models.embedding_cache import embedding_cache
+from models.response_cache import response_cache
+from config.settings import settings
+from fastapi.responses import JSONResponse
+
+
+# Behaviour shared by the OpenAI, Gemini and Llama models around their client
+# calls. A provider sets `provider` and, in __init__, the request fields
+# (user_query, temperature, model_type, search_filter, session_id, time),
+# model_name, docs_collection, async_db, history_collection,
+# user_query_embedding and context_ids. It embeds the query in
+# generate_query_embedding(), builds its prompts in prompt_from_context() and
+# prompt_without_context(), and streams its answers from
+# stream_completion(specific_prompt).
+class ProviderModel:
+    provider = None
+
+    # Chunks retrieved for the query, packed into the provider's context budget
+    async def find_similar_documents(
+        self, user_query_embedding, threshold=0.5, top_k=10
+    ):
+        try:
+            top_document_ids = await run_in_executor(
+                cpu_executor,
+                find_similar_document_ids,
+                self.docs_collection,
+                self.user_query,
+                user_query_embedding,
+                threshold=threshold,
+                top_k=top_k,
+                search_filter=self.search_filter,
+            )
+            chunks = pack_context(
+                self.user_query_embedding,
+                await vector_index.fetch_chunks(
+                    self.async_db["Upload_Docs"], top_document_ids
+                ),
+                settings.context_token_budgets[self.provider],
+                mmr_lambda=settings.context_mmr_lambda,
+                duplicate_threshold=settings.context_duplicate_threshold,
+            )
+            self.context_ids = [doc_id for doc_id, _, _ in chunks]
+            return [text for _, text, _ in chunks]
+        except Exception as e:
+            return JSONResponse(
+                content={"message": "Network issue! Retry it", "error": str(e)},
+                status_code=400,
+            )
+
+    # Cached answers are shared by the provider, model, temperature and prompt
+    # (with or without context) over the same retrieved chunks
+    def response_cache_key(self, context_ids) -> tuple:
+        return response_cache.group_key(
+            self.provider,
+            self.model_name,
+            self.temperature,
+            "context" if context_ids else "direct",
+            context_ids,
+        )
+
+    # Check the response cache before calling the provider: a near-identical
+    # query answered over the same retrieved chunks reuses the cached answer
+    async def cached_response(self, generate, *args, context_ids=()) -> str:
+        if not settings.response_cache:
+            return await generate(*args)
+        if self.user_query_embedding is None:
+            self.user_query_embedding = await embedding_cache.embed_query(
+                self.user_query
+            )
+        group_key = self.response_cache_key(context_ids)
+        response = response_cache.lookup(group_key, self.user_query_embedding)
+        if response is None:
+            response = await generate(*args)
+            if response:
+                response_cache.store(group_key, self.user_query_embedding, response)
+        return response
+
+    # Stream through the response cache: a hit is sent as a single chunk, a
+    # miss is streamed from the provider and cached once complete
+    async def stream_cached_response(self, specific_prompt: str, context_ids=()):
+        group_key = None
+        if settings.response_cache:
+            if self.user_query_embedding is None:
+                self.user_query_embedding = await embedding_cache.embed_query(
+                    self.user_query
+                )
+            group_key = self.response_cache_key(context_ids)
+            response = response_cache.lookup(group_key, self.user_query_embedding)
+            if response is not None:
+                yield response
+                return
+        parts = []
+        async for token in self.stream_completion(specific_prompt):
+            parts.append(token)
+            yield token
+        if group_key is not None and parts:
+            response_cache.store(group_key, self.user_query_embedding, "".join(parts))
+
+    # Context of an earlier turn of this session, reused through the chunk ids
+    # stored with that turn, when the query retrieved nothing of its own
+    async def follow_up_documents(self) -> list:
+        turns = await recent_session_turns(
+            self.history_collection, self.session_id, settings.follow_up_turns
+        )
+        turn = follow_up_turn(
+            turns,
+            self.user_query,
+            self.user_query_embedding,
+            settings.follow_up_threshold,
+            settings.follow_up_bare_threshold,
+        )
+        if turn is None:
+            return []
+        chunks = await vector_index.fetch_chunks(
+            self.async_db["Upload_Docs"], turn["context_ids"]
+        )
+        self.context_ids = [doc_id for doc_id, _, _ in chunks]
+        return [text for _, text, _ in chunks]
+
+    # Queue the session history for MongoDB, with the context ids and the
+    # query embedding of the turn for follow-up queries (the history writer
+    # adds the answer embedding)
+    async def session_history(self, response, top_documents) -> None:
+        responseData = {
+            "session_id": self.session_id,
+            "user_query": self.user_query,
+            "response": response,
+            "top_documents": top_documents,
+            "context_ids": self.context_ids,
+            "query_embedding": encode_embedding(self.user_query_embedding),
+            "date": self.time[0],
+            "time": self.time[1],
+            "del": 0,
+        }
+        await history_writer.write(responseData)
+        return None
+
+    # Server-sent events of the streaming endpoint: answers from the retrieved
+    # or follow-up context, or from the model alone, are streamed token by token
+    async def stream_response_to_user(self):
+        started = time.perf_counter()
+        on_complete = None
+        try:
+            if self.model_type in ("knowledge_graph", "knowledge_graph_and_AI"):
+                user_query_embedding = await self.generate_query_embedding()
+                top_documents = await self.find_similar_documents(
+                    user_query_embedding,
+                    threshold=0.6 if self.model_type == "knowledge_graph" else 0.5,
+                    top_k=10,
+                )
+                if not top_documents:
+                    top_documents = await self.follow_up_documents()
+                if top_documents:
+                    tokens = self.stream_cached_response(
+                        self.prompt_from_context(top_documents),
+                        context_ids=self.context_ids,
+                    )
+                    on_complete = lambda response: self.session_history(
+                        response, top_documents
+                    )
+                elif self.model_type == "knowledge_graph":
+                    yield sse_event(
+                        "done",
+                        {
+                            "message": "No relevant documents found in the PDF collection."
+                        },
+                    )
+                    return
+                else:
+                    tokens = self.stream_cached_response(self.prompt_without_context())
+            elif self.model_type == "AI":
+                tokens = self.stream_cached_response(self.prompt_without_context())
+            else:
+                yield sse_event("error", {"message": "Invalid model type"})
+                return
+        except Exception as e:
+            yield sse_event(
+                "error", {"message": "Failed to generate a response.", "error": str(e)}
+            )
+            return
+        async for event in stream_answer(tokens, self.provider, started, on_complete):
+            yield event
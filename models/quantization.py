@@ -0,0 +1,154 @@
+import threading
+import numpy as np
+from models.ann_index import ASSIGN_BATCH_ROWS, sample_blocks
+
+# Rows decoded per batch while scoring codes, bounding the float32 temporaries
+SCORE_BATCH_ROWS = 8192
+
+
+# Per-dimension 8-bit scalar quantizer: each component is mapped linearly from
+# the [min, max] range seen in training onto 256 levels (4x smaller rows)
+class ScalarQuantizer:
+    def __init__(self):
+        self.low = None
+        self.scale = None
+
+    def train(self, sample: np.ndarray) -> None:
+        self.low = sample.min(axis=0)
+        self.scale = (sample.max(axis=0) - self.low) / 255
+        self.scale[self.scale == 0] = 1.0
+        return None
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        codes = np.rint((np.asarray(vectors) - self.low) / self.scale)
+        return np.clip(codes, 0, 255).astype(np.uint8)
+
+    # q . x ~= q . (low + code * scale) = (q * scale) . code + q . low
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        scaled_query = (query * self.scale).astype(np.float32)
+        scores = np.empty(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BATCH_ROWS):
+            batch = codes[start : start + SCORE_BATCH_ROWS]
+            scores[start : start + len(batch)] = batch.astype(np.float32) @ scaled_query
+        return scores + float(query @ self.low)
+
+
+# Product quantizer: the vector is split into subspaces, each encoded as the
+# id of its nearest of 256 sub-centroids (one byte per subspace). Queries are
+# scored with asymmetric distance computation through a lookup table.
+class ProductQuantizer:
+    def __init__(self, subspaces: int = 96, iterations: int = 10, seed: int = 0):
+        self.subspaces = subspaces
+        self.iterations = iterations
+        self.rng = np.random.default_rng(seed)
+        self.codebooks = None
+
+    def split(self, vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        return vectors.reshape(
+            len(vectors), self.subspaces, vectors.shape[1] // self.subspaces
+        )
+
+    # Nearest sub-centroid by squared euclidean distance
+    def nearest(self, sub_vectors: np.ndarray, codebook: np.ndarray) -> np.ndarray:
+        distances = (codebook**2).sum(axis=1) - 2 * sub_vectors @ codebook.T
+        return np.argmin(distances, axis=1)
+
+    def train(self, sample: np.ndarray) -> None:
+        sub_samples = self.split(sample)
+        centroids = min(256, len(sample))
+        codebooks = []
+        for subspace in range(self.subspaces):
+            points = sub_samples[:, subspace]
+            codebook = points[self.rng.choice(len(points), centroids, replace=False)]
+            for _ in range(self.iterations):
+                assignments = self.nearest(points, codebook)
+                counts = np.bincount(assignments, minlength=centroids)
+                sums = np.stack(
+                    [
+                        np.bincount(assignments, points[:, dim], minlength=centroids)
+                        for dim in range(points.shape[1])
+                    ],
+                    axis=1,
+                )
+                filled = counts > 0
+                codebook[filled] = sums[filled] / counts[filled, None]
+            codebooks.append(codebook)
+        self.codebooks = np.stack(codebooks)
+        return None
+
+    def encode(self, vectors: np.ndarray) -> np.ndarray:
+        sub_vectors = self.split(vectors)
+        codes = np.empty((len(sub_vectors), self.subspaces), dtype=np.uint8)
+        for subspace, codebook in enumerate(self.codebooks):
+            codes[:, subspace] = self.nearest(sub_vectors[:, subspace], codebook)
+        return codes
+
+    def score(self, codes: np.ndarray, query: np.ndarray) -> np.ndarray:
+        lookup = np.einsum("mkd,md->mk", self.codebooks, self.split(query[None])[0])
+        scores = np.zeros(len(codes), dtype=np.float32)
+        for start in range(0, len(codes), SCORE_BATCH_ROWS):
+            # Column-major batches make each per-subspace gather contiguous
+            batch = np.asfortranarray(codes[start : start + SCORE_BATCH_ROWS])
+            batch_scores = scores[start : start + len(batch)]
+            for subspace in range(self.subspaces):
+                batch_scores += lookup[subspace].take(batch[:, subspace])
+        return scores
+
+
+# Compressed codes of every index block. The first pass scores the codes and
+# only a shortlist of candidates is re-scored with the full-precision rows.
+class QuantizedCodes:
+    def __init__(self, quantizer, train_size: int = 50000, seed: int = 0):
+        self.quantizer = quantizer
+        self.train_size = train_size
+        self.rng = np.random.default_rng(seed)
+        self.lock = threading.Lock()
+        self.trained = False
+        self.codes = {}
+
+    def train(self, blocks: list) -> None:
+        self.quantizer.train(sample_blocks(blocks, self.train_size, self.rng))
+        with self.lock:
+            self.codes = {}
+            self.trained = True
+        return None
+
+    # Codes of a block; blocks that only grew encode just their new rows
+    def block_codes(self, key: str, vectors: np.ndarray) -> np.ndarray:
+        with self.lock:
+            codes = self.codes.get(key)
+        if codes is not None and len(codes) == len(vectors):
+            return codes
+        if codes is None or len(codes) > len(vectors):
+            codes = self.quantizer.encode(vectors[:0])
+        new_codes = [codes]
+        for start in range(len(codes), len(vectors), ASSIGN_BATCH_ROWS):
+            new_codes.append(
+                self.quantizer.encode(vectors[start : start + ASSIGN_BATCH_ROWS])
+            )
+        codes = np.concatenate(new_codes)
+        with self.lock:
+            self.codes[key] = codes
+        return codes
+
+    # Best `size` rows of a block, or of its candidate rows, by code score;
+    # None keeps every row of a block that is already small enough
+    def shortlist(self, key: str, vectors, query, rows, size: int) -> np.ndarray:
+        codes = self.block_codes(key, vectors)
+        if rows is None:
+            if len(codes) <= size:
+                return None
+            scores = self.quantizer.score(codes, query)
+            return np.sort(np.argpartition(scores, -size)[-size:])
+        if len(rows) <= size:
+            return rows
+        scores = self.quantizer.score(codes[rows], query)
+        return np.sort(rows[np.argpartition(scores, -size)[-size:]])
+
+    # Drop the codes of blocks that no longer exist
+    def forget(self, live_keys: set) -> None:
+        with self.lock:
+            for key in set(self.codes) - live_keys:
+                del self.codes[key]
+        return None
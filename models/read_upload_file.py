@@ -1,98 +1,70 @@
-from config.mongo_db import mongo_db
-from datetime import datetime
-from fastapi.responses import JSONResponse
-from langchain_text_splitters import CharacterTextSplitter
-from langchain_community.document_loaders import TextLoader, PyPDFLoader, Docx2txtLoader
-from langchain_community.embeddings.sentence_transformer import (
-    SentenceTransformerEmbeddings,
+from config.settings import settings
+from config.executors import parse_process_executor
+from models.document_pages import (
+    iter_pdf_chunks,
+    pdf_page_count,
+    pdf_page_chunks,
+    iter_docx_blocks,
+    iter_text_blocks,
+    split_text,
 )
+from datetime import datetime
+import os
 import warnings
 
 warnings.filterwarnings("ignore")
 
 
 class TextProcessor:
-    def __init__(self, file_path: str):
+    def __init__(self, file_path: str, source: str = None, parallel_pages=True):
         self.file_path = file_path
-        self.db = mongo_db["RAG_DB"]
-        self.docs_collection = self.db["Upload_Docs"]
-        self.text_chunks = []
-
-    ## Extract the text from pdf, docx & text files
-    def extract_text(self):
-        try:
-            ## Load the data from pdf file
-            if self.file_path.lower().endswith(".pdf"):
-                loader = PyPDFLoader(self.file_path)
-                documents = loader.load_and_split()
-                text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=10)
-                text = text_splitter.split_documents(documents)
-                self.text_chunks += text
-                return self.text_chunks
-
-            ## Load the data from text file
-            elif self.file_path.lower().endswith(".txt"):
-                loader = TextLoader(self.file_path)
-                documents = loader.load()
-                text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=10)
-                text = text_splitter.split_documents(documents)
-                self.text_chunks += text
-                return self.text_chunks
+        # Name the chunks are stored under, the uploaded file's name or its path
+        self.source = source or file_path
+        # Extract PDF pages on the parse process pool, or one by one in this
+        # process when it already is a pool worker
+        self.parallel_pages = parallel_pages
 
-            ## Load the data from docx file
-            elif self.file_path.lower().endswith(".docx"):
-                loader = Docx2txtLoader(self.file_path)
-                documents = loader.load()
-                text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=10)
-                text = text_splitter.split_documents(documents)
-                self.text_chunks += text
-                return self.text_chunks
+    ## Extension of the pdf, docx or text file, None if the format is not supported
+    def file_format(self):
+        extension = os.path.splitext(self.file_path.lower())[1]
+        return extension if extension in (".pdf", ".docx", ".txt") else None
 
-            ## File format not supported
-            else:
-                return JSONResponse(
-                    content={
-                        "message": "File format not supported. Please upload pdf, docx or txt file."
-                    },
-                    status_code=400,
+    ## Chunks of the file page by page. PDF pages are extracted in parallel on
+    ## the parse process pool; docx and text files are streamed in blocks.
+    def page_chunks(self):
+        if self.file_format() == ".pdf" and not self.parallel_pages:
+            for page in range(pdf_page_count(self.file_path)):
+                yield pdf_page_chunks(
+                    self.file_path, page, chunk_size=500, chunk_overlap=10
                 )
-        except Exception as e:
-            return JSONResponse(
-                content={
-                    "message": "Retry it! File not read and extract text from it.",
-                    "error": str(e),
-                },
-                status_code=400,
+            return
+        if self.file_format() == ".pdf":
+            yield from iter_pdf_chunks(
+                self.file_path,
+                parse_process_executor(),
+                settings.parse_pages_in_flight,
+                chunk_size=500,
+                chunk_overlap=10,
             )
+            return
+        if self.file_format() == ".docx":
+            blocks = iter_docx_blocks(self.file_path, settings.parse_block_chars)
+        else:
+            blocks = iter_text_blocks(self.file_path, settings.parse_block_chars)
+        for block in blocks:
+            yield split_text(block, chunk_size=500, chunk_overlap=10)
 
-    # Generate embeddings for text chunks and store in MongoDB
-    def store_embeddings_in_mongodb(self) -> None:
-        embedding_model = SentenceTransformerEmbeddings(model_name="all-MiniLM-L6-v2")
-        for chunk in self.text_chunks:
-            embedding = embedding_model.embed_documents([chunk.page_content])[0]
-            document = {
-                "text": chunk.page_content,
-                "embedding": embedding,
-                "timestamp": datetime.today().strftime("%Y-%m-%d %H:%M:%S"),
-                "status": 1,
-            }
-            self.docs_collection.insert_one(document)
-        return None
-
-    # Read the file and store the embeddings in MongoDB
-    def read_file_and_store_embeddings(self):
-        try:
-            self.extract_text()
-            self.store_embeddings_in_mongodb()
-            return JSONResponse(
-                content={"message": "File read and embeddings stored successfully."},
-                status_code=200,
-            )
-        except Exception as e:
-            return JSONResponse(
-                content={
-                    "message": "Retry it! File not read and store embeddings in MongoDB.",
-                    "error": str(e),
-                },
-                status_code=400,
-            )
+    ## Extract the text from pdf, docx & text files page by page and yield
+    ## the chunk documents to store, counting the pages read into progress
+    def extract_text(self, progress: dict = None):
+        timestamp = datetime.today().strftime("%Y-%m-%d %H:%M:%S")
+        for chunks in self.page_chunks():
+            if progress is not None:
+                progress["pages"] = progress.get("pages", 0) + 1
+            for chunk in chunks:
+                yield {
+                    "source": self.source,
+                    "text": chunk,
+                    "timestamp": timestamp,
+                    "status": 1,
+                }
@@ -0,0 +1,102 @@
+import itertools
+import threading
+import time
+import numpy as np
+from collections import OrderedDict
+from bson import ObjectId
+from config.metrics import metrics
+from config.settings import settings
+
+
+# Cache of generated answers in front of the LLM providers. Answers are
+# grouped by (provider, model, temperature, prompt, retrieved chunk ids); a
+# lookup hits when a cached query in that group has a cosine similarity above
+# the threshold. Entries expire after a TTL, the least recently used are
+# evicted beyond the size limit, and the entries that depend on a chunk are
+# dropped when the chunk is deleted or re-ingested.
+class ResponseCache:
+    def __init__(self, threshold=0.95, ttl_seconds=3600.0, max_entries=1000):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.lock = threading.Lock()
+        self.entries = OrderedDict()
+        self.groups = {}
+        self.dependents = {}
+        self.entry_ids = itertools.count()
+
+    def group_key(self, provider, model, temperature, prompt, context_ids) -> tuple:
+        chunk_ids = frozenset(ObjectId(doc_id).binary for doc_id in context_ids)
+        return provider, model, float(temperature), prompt, chunk_ids
+
+    def normalize(self, embedding) -> np.ndarray:
+        embedding = np.asarray(embedding, dtype=np.float32).reshape(-1)
+        norm = np.linalg.norm(embedding)
+        return embedding / norm if norm else embedding
+
+    def remove(self, entry_id) -> None:
+        group_key, _, _, _ = self.entries.pop(entry_id)
+        self.groups[group_key].discard(entry_id)
+        if not self.groups[group_key]:
+            del self.groups[group_key]
+        for chunk_id in group_key[4]:
+            self.dependents[chunk_id].discard(entry_id)
+            if not self.dependents[chunk_id]:
+                del self.dependents[chunk_id]
+        return None
+
+    def lookup(self, group_key: tuple, query_embedding):
+        query = self.normalize(query_embedding)
+        now = time.monotonic()
+        best, best_score = None, self.threshold
+        with self.lock:
+            for entry_id in list(self.groups.get(group_key, ())):
+                _, embedding, response, expires_at = self.entries[entry_id]
+                if expires_at <= now:
+                    self.remove(entry_id)
+                    continue
+                score = float(embedding @ query)
+                if score >= best_score:
+                    best, best_score = entry_id, score
+            if best is not None:
+                self.entries.move_to_end(best)
+                response = self.entries[best][2]
+        metrics.increment(
+            "response_cache_hits" if best is not None else "response_cache_misses"
+        )
+        return response if best is not None else None
+
+    def store(self, group_key: tuple, query_embedding, response: str) -> None:
+        entry_id = next(self.entry_ids)
+        expires_at = time.monotonic() + self.ttl_seconds
+        with self.lock:
+            self.entries[entry_id] = (
+                group_key,
+                self.normalize(query_embedding),
+                response,
+                expires_at,
+            )
+            self.groups.setdefault(group_key, set()).add(entry_id)
+            for chunk_id in group_key[4]:
+                self.dependents.setdefault(chunk_id, set()).add(entry_id)
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)))
+        return None
+
+    # Drop every answer generated from any of these chunks
+    def invalidate(self, chunk_ids: list) -> None:
+        with self.lock:
+            for chunk_id in chunk_ids:
+                for entry_id in list(
+                    self.dependents.get(ObjectId(chunk_id).binary, ())
+                ):
+                    if entry_id in self.entries:
+                        self.remove(entry_id)
+        return None
+
+
+response_cache = ResponseCache(
+    threshold=settings.response_cache_threshold,
+    ttl_seconds=settings.response_cache_ttl,
+    max_entries=settings.response_cache_size,
+)
@@ -0,0 +1,59 @@
+from config.settings import settings
+from models.vector_index import vector_index
+from models.lexical_index import lexical_index, reciprocal_rank_fusion
+
+
+# Build the indexes if the startup hook has not done it yet
+def ensure_indexes_loaded(docs_collection) -> None:
+    if not vector_index.loaded:
+        vector_index.load_from_mongodb(docs_collection)
+    if settings.hybrid_search and not lexical_index.loaded:
+        lexical_index.load_from_mongodb(docs_collection)
+    return None
+
+
+# Ids of the chunks most relevant to the user query, best first. Dense
+# matches above the similarity threshold are fused with the BM25 keyword
+# matches through reciprocal-rank fusion when hybrid search is enabled.
+def find_similar_document_ids(
+    docs_collection,
+    user_query: str,
+    user_query_embedding,
+    threshold: float = 0.5,
+    top_k: int = 10,
+    search_filter=None,
+) -> list:
+    ensure_indexes_loaded(docs_collection)
+    if not settings.hybrid_search:
+        matches = vector_index.search(
+            user_query_embedding,
+            top_k=top_k,
+            threshold=threshold,
+            search_filter=search_filter,
+        )
+        return [doc_id for doc_id, _ in matches]
+
+    dense_matches = vector_index.search(
+        user_query_embedding,
+        top_k=settings.hybrid_dense_top_k or top_k,
+        threshold=threshold,
+        search_filter=search_filter,
+    )
+    lexical_index.sync(vector_index.segments, docs_collection)
+    lexical_index.sync_tombstones(
+        vector_index.tombstones, vector_index.tombstone_version
+    )
+    lexical_matches = lexical_index.search(
+        user_query,
+        top_k=settings.hybrid_lexical_top_k or top_k,
+        search_filter=search_filter,
+    )
+    rankings = [
+        [doc_id for doc_id, _ in dense_matches],
+        [
+            doc_id
+            for doc_id, score in lexical_matches
+            if score >= settings.lexical_min_score
+        ],
+    ]
+    return reciprocal_rank_fusion(rankings, k=settings.rrf_k)[:top_k]
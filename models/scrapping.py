@@ -1,26 +1,17 @@
 import requests
-from models.webpage_scrapping import Webpage_Scraper
-from models.web_scrapping import Website_Scraper
 from urllib.parse import urlparse
-from config.mongo_db import mongo_db
+from config.settings import settings
+from models.chunker import split_text
+from models.web_crawler import web_crawler
 import pytz
 from datetime import datetime
-from langchain.schema import Document
 from fastapi.responses import JSONResponse
-from langchain_community.embeddings.sentence_transformer import (
-    SentenceTransformerEmbeddings,
-)
 
 
 # To extract all the text from given website url
-class WebScraper(Webpage_Scraper, Website_Scraper):
+class WebScraper:
     def __init__(self, url: str):
         self.url = url
-        self.db = mongo_db["RAG_DB"]
-        self.docs_collection = self.db["Upload_Docs"]
-        self.embedding_model = SentenceTransformerEmbeddings(
-            model_name="all-MiniLM-L6-v2"
-        )
         self.time = self.current_time_and_date()
 
     ## Function for Current Time & Date as per timezone
@@ -51,97 +42,33 @@ class WebScraper(Webpage_Scraper, Website_Scraper):
             )
 
             # Check if the status code is in the range of successful responses
-            response = requests.get(check_url, allow_redirects=True)
+            response = requests.get(
+                check_url, allow_redirects=True, timeout=settings.crawl_timeout_seconds
+            )
             return True if response.status_code < 400 else False
 
         except requests.RequestException as e:
             return JSONResponse(content={"message": f"Error: {str(e)}"})
 
-    # Extract the text from the particular webpage url
-    def extract_and_clean_text(self):
-        try:
-            # Parse the URL
-            parsed_url = urlparse(self.url)
-
-            # Get the path component of the URL
-            path = parsed_url.path
-
-            # Check if it's the landing page or about-us page
-            if path == "/" or path == "":
-                return self.extract_text_from_website()
-            else:
-                return self.extract_text_from_webpage()
-
-        except Exception as e:
-            return JSONResponse(
-                content={
-                    "message": "Retry it! May be website has protected to restriction of scrapping",
-                    "error": str(e),
-                },
-                status_code=400,
-            )
-
-    # Split the cleaned text into chunks of 500 characters and load into documents
-    def split_and_load_text_into_documents(self, chunk_size=500):
-        try:
-            cleaned_text = self.extract_and_clean_text()
-            words = cleaned_text.split()
-            chunks = [
-                " ".join(words[i : i + chunk_size])
-                for i in range(0, len(words), chunk_size)
-            ]
-            documents = [Document(page_content=chunk) for chunk in chunks]
-            return documents
-        except Exception as e:
-            return JSONResponse(
-                content={
-                    "message": "Retry it! May be website has protected to restriction of scrapping",
-                    "error": str(e),
-                },
-                status_code=400,
-            )
-
-    # Generate embeddings for text chunks and store in MongoDB
-    def store_embeddings_in_mongodb(self, documents: list):
-        try:
-            for chunk in documents:
-                embedding = self.embedding_model.embed_documents([chunk.page_content])[
-                    0
-                ]
-                document = {
-                    "url": self.url,
-                    "text": chunk.page_content,
-                    "embedding": embedding,
+    # A landing page url is crawled as a website, any other url as one webpage
+    def is_website(self) -> bool:
+        return urlparse(self.url).path in ("", "/")
+
+    # Crawl the website or fetch the webpage, on the event loop `loop`, and
+    # yield the chunk documents of each page as it arrives, counting the pages
+    # into progress. Pages are cut into chunks of 500 words.
+    def extract_documents(self, loop, progress: dict = None, chunk_size=500):
+        for page_url, text in web_crawler.iter_pages(
+            self.url, loop, follow_links=self.is_website()
+        ):
+            if progress is not None:
+                progress["pages"] = progress.get("pages", 0) + 1
+            for chunk in split_text(text, chunk_size, tokens=True):
+                yield {
+                    "source": self.url,
+                    "url": page_url,
+                    "text": chunk,
                     "date": self.time[0],
                     "time": self.time[1],
                     "status": 1,
                 }
-                self.docs_collection.insert_one(document)
-            return JSONResponse(
-                content={"message": "Web Scraping Successfully"}, status_code=200
-            )
-        except Exception:
-            return JSONResponse(
-                content={"message": "Retry it! Server Error"}, status_code=400
-            )
-
-    # Extract the text from the each webpage of the website and store in MongoDB
-    def extracted_text_and_stored(self):
-        try:
-            if self.is_url_clickable() is True:
-                documents = self.split_and_load_text_into_documents()
-                self.store_embeddings_in_mongodb(documents)
-                return JSONResponse(
-                    content={"message": "Web Scraping Successfully"}, status_code=200
-                )
-            else:
-                return JSONResponse(
-                    content={
-                        "message": "URL is not clickable. Copied it from the browser carefully"
-                    },
-                    status_code=400,
-                )
-        except Exception:
-            return JSONResponse(
-                content={"message": "Retry it! Server Error"}, status_code=400
-            )
@@ -0,0 +1,185 @@
+import threading
+import numpy as np
+from datetime import datetime, timezone
+
+# Per-row metadata kept next to the vectors of every index block. "source" is
+# a code into the block's table of source names (-1 when unknown) and
+# "timestamp" the ingest time in epoch seconds.
+METADATA_DTYPE = np.dtype([("source", "<i4"), ("timestamp", "<f8"), ("status", "i1")])
+# Separates the source of a scraped chunk from its page url in a source name
+PAGE_URL_SEPARATOR = "\n"
+
+
+# Source name of a chunk in the source table: its source, followed by the url
+# of its page when that is a page of the scraped website rather than its
+# landing url, so url_prefix can select pages below a path
+def source_name(source: str = None, url: str = None):
+    if source is None or url is None or url == source:
+        return source or url
+    return f"{source}{PAGE_URL_SEPARATOR}{url}"
+
+
+# (source, page url) of a source name; the url is the source itself when no
+# page url was stored
+def split_source_name(name: str) -> tuple:
+    source, _, url = name.partition(PAGE_URL_SEPARATOR)
+    return source, url or source
+
+
+# Ingest time of each 12-byte ObjectId: its first 4 bytes are big-endian
+# seconds since the epoch
+def id_timestamps(ids: np.ndarray) -> np.ndarray:
+    id_bytes = np.frombuffer(np.ascontiguousarray(ids).tobytes(), dtype=np.uint8)
+    seconds = id_bytes.reshape(-1, 12)[:, :4].copy().view(">u4")[:, 0]
+    return seconds.astype(np.float64)
+
+
+# Build the source table and metadata records of a batch of rows
+def make_metadata(ids: np.ndarray, sources: list = None, statuses: list = None):
+    source_table, codes = [], {}
+    records = np.empty(len(ids), dtype=METADATA_DTYPE)
+    records["timestamp"] = id_timestamps(ids)
+    records["source"] = -1
+    records["status"] = 1
+    for row, source in enumerate(sources or []):
+        if source is None:
+            continue
+        if source not in codes:
+            codes[source] = len(source_table)
+            source_table.append(source)
+        records["source"][row] = codes[source]
+    for row, status in enumerate(statuses or []):
+        if status is not None:
+            records["status"][row] = status
+    return source_table, records
+
+
+# Re-code batch metadata into a growing source table shared by its block
+def remap_sources(metadata: tuple, sources: list, source_codes: dict) -> np.ndarray:
+    source_table, records = metadata
+    remap = np.empty(len(source_table) + 1, dtype=np.int32)
+    remap[-1] = -1
+    for code, source in enumerate(source_table):
+        if source not in source_codes:
+            source_codes[source] = len(sources)
+            sources.append(source)
+        remap[code] = source_codes[source]
+    records = records.copy()
+    records["source"] = remap[records["source"]]
+    return records
+
+
+# Concatenate the metadata of several blocks into one source table
+def merge_metadata(parts: list) -> tuple:
+    source_table, source_codes = [], {}
+    merged = [remap_sources(part, source_table, source_codes) for part in parts]
+    return source_table, np.concatenate(merged)
+
+
+# Metadata of one index block with per-source row postings built lazily, so a
+# source filter selects its rows without scanning the whole block
+class BlockMetadata:
+    def __init__(self, sources: list, records: np.ndarray):
+        self.sources = sources
+        self.records = records
+        self.lock = threading.Lock()
+        self.source_postings = None
+
+    def rows_for_sources(self, codes: list) -> np.ndarray:
+        with self.lock:
+            if self.source_postings is None:
+                order = np.argsort(self.records["source"], kind="stable")
+                counts = np.bincount(
+                    self.records["source"] + 1, minlength=len(self.sources) + 1
+                )
+                offsets = np.zeros(len(counts) + 1, dtype=np.int64)
+                np.cumsum(counts, out=offsets[1:])
+                self.source_postings = (order, offsets)
+            order, offsets = self.source_postings
+        rows = [order[offsets[code + 1] : offsets[code + 2]] for code in codes]
+        return np.sort(np.concatenate(rows)) if rows else np.empty(0, np.int64)
+
+    # Rows of the block allowed by the filter (None: every row)
+    def allowed_rows(self, search_filter) -> np.ndarray:
+        rows = None
+        if search_filter.restricts_source:
+            rows = self.rows_for_sources(
+                [
+                    code
+                    for code, source in enumerate(self.sources)
+                    if search_filter.matches_source(source)
+                ]
+            )
+        if not search_filter.restricts_records:
+            return rows
+        records = self.records if rows is None else self.records[rows]
+        mask = np.ones(len(records), dtype=bool)
+        if search_filter.from_time is not None:
+            mask &= records["timestamp"] >= search_filter.from_time
+        if search_filter.to_time is not None:
+            mask &= records["timestamp"] <= search_filter.to_time
+        if search_filter.status is not None:
+            mask &= records["status"] == search_filter.status
+        return np.flatnonzero(mask) if rows is None else rows[mask]
+
+
+# Restriction of a query to some sources, an ingest time range and a status
+class SearchFilter:
+    def __init__(
+        self,
+        source=None,
+        url_prefix: str = None,
+        from_date: str = None,
+        to_date: str = None,
+        status: int = None,
+    ):
+        self.sources = [source] if isinstance(source, str) else source
+        self.url_prefix = url_prefix
+        self.from_time = self.parse_time(from_date)
+        self.to_time = self.parse_time(to_date)
+        self.status = int(status) if status is not None else None
+
+    # Build the filter from the optional "filters" object of a query request
+    @classmethod
+    def from_request(cls, filters: dict = None):
+        filters = filters or {}
+        return cls(
+            source=filters.get("source"),
+            url_prefix=filters.get("url_prefix"),
+            from_date=filters.get("from_date"),
+            to_date=filters.get("to_date"),
+            status=filters.get("status"),
+        )
+
+    # ISO 8601 date or datetime (UTC when no offset is given) to epoch seconds
+    def parse_time(self, value: str):
+        if value is None:
+            return None
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is None:
+            parsed = parsed.replace(tzinfo=timezone.utc)
+        return parsed.timestamp()
+
+    @property
+    def restricts_source(self) -> bool:
+        return self.sources is not None or self.url_prefix is not None
+
+    @property
+    def restricts_records(self) -> bool:
+        return (
+            self.from_time is not None
+            or self.to_time is not None
+            or self.status is not None
+        )
+
+    @property
+    def is_empty(self) -> bool:
+        return not self.restricts_source and not self.restricts_records
+
+    def matches_source(self, name: str) -> bool:
+        source, url = split_source_name(name)
+        if self.sources is not None and source not in self.sources:
+            return False
+        if self.url_prefix is not None and not url.startswith(self.url_prefix):
+            return False
+        return True
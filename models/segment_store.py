@@ -0,0 +1,191 @@
+import os
+import json
+import math
+import time
+import fcntl
+import numpy as np
+from contextlib import contextmanager
+from models.search_filter import METADATA_DTYPE, make_metadata, merge_metadata
+
+# Sidecar record of a segment row: the 12-byte ObjectId and its row offset
+SIDECAR_DTYPE = np.dtype([("id", "V12"), ("row", "<u4")])
+
+
+# Append-only on-disk store of normalized float32 embedding rows.
+# Each segment is a set of files: "<name>.f32" holds fixed-width rows,
+# "<name>.ids" the id/offset sidecar and "<name>.meta" the per-row source,
+# timestamp and status used by search filters; the segment's source names are
+# kept in its manifest entry. A MANIFEST lists the live segments and is
+# replaced atomically, so worker processes mmap the same files read-only and
+# the OS page cache keeps a single physical copy of the corpus.
+class SegmentStore:
+    def __init__(
+        self, directory: str, dim: int, max_segments: int = 64, merge_factor: int = 4
+    ):
+        self.directory = directory
+        self.dim = dim
+        self.max_segments = max_segments
+        self.merge_factor = max(2, merge_factor)
+        self.manifest_path = os.path.join(directory, "MANIFEST")
+        self.tombstones_path = os.path.join(directory, "TOMBSTONES")
+        os.makedirs(directory, exist_ok=True)
+
+    # Serialize writers across processes with an advisory file lock
+    @contextmanager
+    def lock(self):
+        with open(os.path.join(self.directory, "LOCK"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # Cheap change detector for readers: the manifest is replaced on every write
+    def manifest_stamp(self):
+        try:
+            stat = os.stat(self.manifest_path)
+            return stat.st_ino, stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def read_manifest(self) -> list:
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)["segments"]
+        except FileNotFoundError:
+            return []
+
+    def write_manifest(self, segments: list) -> None:
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"segments": segments}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_path)
+        return None
+
+    # Ids of removed rows, appended as 12-byte records shared by every reader
+    def append_tombstones(self, ids) -> None:
+        with self.lock():
+            with open(self.tombstones_path, "ab") as f:
+                f.write(b"".join(ids))
+                f.flush()
+                os.fsync(f.fileno())
+        return None
+
+    def tombstones_stamp(self):
+        try:
+            stat = os.stat(self.tombstones_path)
+            return stat.st_mtime_ns, stat.st_size
+        except FileNotFoundError:
+            return None
+
+    def read_tombstones(self) -> set:
+        try:
+            with open(self.tombstones_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return set()
+        size = len(data) - len(data) % 12
+        return {data[start : start + 12] for start in range(0, size, 12)}
+
+    def segment_paths(self, name: str) -> tuple:
+        base = os.path.join(self.directory, name)
+        return base + ".f32", base + ".ids", base + ".meta"
+
+    # Write the rows and sidecars of a new segment (not yet visible to readers)
+    def write_segment(self, ids, vectors: np.ndarray, metadata: tuple) -> dict:
+        name = f"seg-{time.time_ns():020d}-{os.getpid()}"
+        vectors_path, ids_path, metadata_path = self.segment_paths(name)
+        sources, records = metadata
+        sidecar = np.empty(len(ids), dtype=SIDECAR_DTYPE)
+        sidecar["id"] = ids
+        sidecar["row"] = np.arange(len(ids), dtype=np.uint32)
+        for path, array in (
+            (vectors_path, np.ascontiguousarray(vectors, dtype="<f4")),
+            (ids_path, sidecar),
+            (metadata_path, records),
+        ):
+            with open(path + ".tmp", "wb") as f:
+                array.tofile(f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + ".tmp", path)
+        return {"name": name, "rows": len(ids), "sources": sources}
+
+    # Append one segment and publish it to the manifest
+    def append(self, ids, vectors: np.ndarray, metadata: tuple) -> None:
+        if not len(ids):
+            return None
+        segment = self.write_segment(ids, vectors, metadata)
+        with self.lock():
+            segments, obsolete = self.compact(self.read_manifest() + [segment])
+            self.write_manifest(segments)
+            self.remove_segments(obsolete)
+        return None
+
+    # Memory-map a segment read-only: (ids, vectors, (sources, records)).
+    # Segments written before the metadata sidecar get default metadata.
+    def open_segment(self, segment: dict) -> tuple:
+        vectors_path, ids_path, metadata_path = self.segment_paths(segment["name"])
+        vectors = np.memmap(
+            vectors_path, dtype="<f4", mode="r", shape=(segment["rows"], self.dim)
+        )
+        ids = np.fromfile(ids_path, dtype=SIDECAR_DTYPE)["id"]
+        if os.path.exists(metadata_path):
+            metadata = (
+                segment.get("sources", []),
+                np.fromfile(metadata_path, dtype=METADATA_DTYPE),
+            )
+        else:
+            metadata = make_metadata(ids)
+        return ids, vectors, metadata
+
+    # Readers that still map the files keep working after they are unlinked
+    def remove_segments(self, segments: list) -> None:
+        for segment in segments:
+            for path in self.segment_paths(segment["name"]):
+                if os.path.exists(path):
+                    os.remove(path)
+        return None
+
+    # Size tier of a segment: segments within a factor of merge_factor rows
+    # of each other share a tier
+    def tier(self, segment: dict) -> int:
+        return int(math.log(max(segment["rows"], 1), self.merge_factor))
+
+    def merge(self, segments: list) -> dict:
+        opened = [self.open_segment(segment) for segment in segments]
+        return self.write_segment(
+            np.concatenate([ids for ids, _, _ in opened]),
+            np.concatenate([vectors for _, vectors, _ in opened]),
+            merge_metadata([metadata for _, _, metadata in opened]),
+        )
+
+    # Size-tiered merging (caller holds the lock): once merge_factor segments
+    # share a tier they are merged into one of a higher tier, so a row is
+    # rewritten about log(corpus / append size) times rather than on every
+    # compaction. The smallest segments are also merged while the store holds
+    # more than max_segments. Returns the live and the obsolete segments.
+    def compact(self, segments: list) -> tuple:
+        obsolete = []
+        while True:
+            tiers = {}
+            for segment in segments:
+                tiers.setdefault(self.tier(segment), []).append(segment)
+            full = [
+                group
+                for _, group in sorted(tiers.items())
+                if len(group) >= self.merge_factor
+            ]
+            if full:
+                group = full[0]
+            elif len(segments) > self.max_segments:
+                by_size = sorted(segments, key=lambda segment: segment["rows"])
+                group = by_size[: len(segments) - self.max_segments + 1]
+            else:
+                return segments, obsolete
+            merged = self.merge(group)
+            segments = [segment for segment in segments if segment not in group]
+            segments.append(merged)
+            obsolete += group
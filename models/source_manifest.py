@@ -0,0 +1,143 @@
+import hashlib
+from datetime import datetime, timezone
+from pymongo import ASCENDING
+from config.mongo_db import mongo_db
+from config.metrics import metrics
+from config.executors import cpu_executor, io_executor, run_in_executor
+from models.vector_index import vector_index
+from models.lexical_index import lexical_index
+from models.response_cache import response_cache
+from models.embedding_cache import normalize_text
+
+# Ids tombstoned per update_many
+TOMBSTONE_BATCH = 1000
+
+
+# Content hash of a chunk: the same text up to Unicode form and whitespace
+# hashes the same
+def chunk_hash(text: str) -> str:
+    return hashlib.blake2b(
+        normalize_text(text).encode("utf-8"), digest_size=16
+    ).hexdigest()
+
+
+# Hash of a whole file, read in blocks
+def file_hash(path: str, block_bytes: int = 1 << 20) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_bytes), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+# Diff of one ingest of a source against its manifest: chunks whose hash the
+# manifest already lists, or that repeat within the source, are skipped, and
+# the hashes no longer produced are the chunks to tombstone
+class SourceSync:
+    def __init__(self, source: str, manifest: dict = None, content_hash: str = None):
+        self.source = source
+        self.manifest = manifest
+        self.known = set(manifest["hashes"]) if manifest else set()
+        self.content_hash = content_hash
+        self.seen = set()
+        self.unchanged = 0
+
+    # The whole file is byte-identical to the one last ingested
+    @property
+    def is_unchanged(self) -> bool:
+        return (
+            self.manifest is not None
+            and self.content_hash is not None
+            and self.manifest.get("content_hash") == self.content_hash
+        )
+
+    @property
+    def vanished(self) -> set:
+        return self.known - self.seen
+
+    def new_documents(self, documents):
+        for document in documents:
+            content_hash = chunk_hash(document["text"])
+            if content_hash in self.seen:
+                continue
+            self.seen.add(content_hash)
+            if content_hash in self.known:
+                self.unchanged += 1
+                continue
+            yield dict(document, content_hash=content_hash)
+
+
+# Per-source manifests of the content hashes of the live chunks, kept in the
+# Source_Manifests collection. A re-ingest embeds and inserts only the chunks
+# that are new and tombstones the ones that vanished: they get status 0 and
+# leave the vector and keyword indexes and the answers cached over them.
+class SourceManifests:
+    def __init__(self, manifests_collection, docs_collection):
+        self.manifests_collection = manifests_collection
+        self.docs_collection = docs_collection
+
+    async def ensure_indexes(self) -> None:
+        await self.docs_collection.create_index(
+            [("source", ASCENDING), ("content_hash", ASCENDING)],
+            unique=True,
+            partialFilterExpression={"status": 1, "content_hash": {"$exists": True}},
+        )
+        return None
+
+    # Start an ingest of a source; `path` is hashed to skip unchanged files
+    async def begin(self, source: str, path: str = None) -> SourceSync:
+        manifest = await self.manifests_collection.find_one({"_id": source})
+        content_hash = (
+            await run_in_executor(io_executor, file_hash, path) if path else None
+        )
+        return SourceSync(source, manifest, content_hash)
+
+    # Finish a complete ingest: tombstone the vanished chunks and record the
+    # hashes now live. The first ingest of a source that predates manifests
+    # also tombstones its chunks stored without a hash, which it re-inserted.
+    async def commit(self, sync: SourceSync) -> int:
+        removed = await self.tombstone(
+            sync.source, sync.vanished, legacy=sync.manifest is None
+        )
+        await self.manifests_collection.replace_one(
+            {"_id": sync.source},
+            {
+                "_id": sync.source,
+                "hashes": sorted(sync.seen),
+                "content_hash": sync.content_hash,
+                "chunks": len(sync.seen),
+                "updated_at": datetime.now(timezone.utc),
+            },
+            upsert=True,
+        )
+        metrics.increment("ingest_chunks_unchanged", sync.unchanged)
+        metrics.increment("ingest_chunks_tombstoned", removed)
+        return removed
+
+    async def tombstone(self, source: str, hashes: set, legacy: bool = False) -> int:
+        conditions = [{"content_hash": {"$in": sorted(hashes)}}] if hashes else []
+        if legacy:
+            conditions.append({"content_hash": {"$exists": False}})
+        if not conditions:
+            return 0
+        cursor = self.docs_collection.find(
+            {"source": source, "status": 1, "$or": conditions}, {"_id": 1}
+        )
+        ids = [doc["_id"] for doc in await cursor.to_list(length=None)]
+        tombstoned_at = datetime.now(timezone.utc)
+        for start in range(0, len(ids), TOMBSTONE_BATCH):
+            await self.docs_collection.update_many(
+                {"_id": {"$in": ids[start : start + TOMBSTONE_BATCH]}},
+                {"$set": {"status": 0, "tombstoned_at": tombstoned_at}},
+            )
+        if ids:
+            await run_in_executor(cpu_executor, vector_index.remove, ids)
+            await run_in_executor(cpu_executor, lexical_index.remove, ids)
+            response_cache.invalidate(ids)
+        return len(ids)
+
+
+source_manifests = SourceManifests(
+    mongo_db.get_async_database("RAG_DB")["Source_Manifests"],
+    mongo_db.get_async_database("RAG_DB")["Upload_Docs"],
+)
@@ -0,0 +1,42 @@
+import json
+import time
+from config.metrics import metrics
+
+
+# One server-sent event
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+# Relay the tokens of an answer as "token" events, then a "done" event with
+# the whole answer once the stream completes. Time to first token and total
+# latency, both measured from `started`, are reported per provider.
+async def stream_answer(tokens, provider: str, started: float, on_complete=None):
+    first_token_ms = None
+    parts = []
+    try:
+        async for token in tokens:
+            if first_token_ms is None:
+                first_token_ms = (time.perf_counter() - started) * 1000
+                metrics.observe(f"{provider}_ttft_ms", first_token_ms)
+            parts.append(token)
+            yield sse_event("token", {"token": token})
+        answer = "".join(parts).replace("\n", "")
+        if answer and on_complete is not None:
+            await on_complete(answer)
+    except Exception as e:
+        metrics.increment(f"{provider}_stream_errors")
+        yield sse_event(
+            "error", {"message": "Failed to generate a response.", "error": str(e)}
+        )
+        return
+    total_ms = (time.perf_counter() - started) * 1000
+    metrics.observe(f"{provider}_total_ms", total_ms)
+    yield sse_event(
+        "done",
+        {
+            "message": answer or "Please, Give the feedback for the better response.",
+            "ttft_ms": first_token_ms,
+            "total_ms": total_ms,
+        },
+    )
@@ -0,0 +1,165 @@
+import hashlib
+import os
+import tempfile
+import uuid
+from python_multipart.multipart import MultipartParser, parse_options_header
+from config.settings import settings
+from config.executors import io_executor, run_in_executor
+
+
+# One uploaded file, held in memory until it outgrows `spool_bytes` and then
+# written to a temporary file in fixed-size blocks. The finished upload is
+# moved into the upload directory under a unique name with its extension.
+# The content is hashed as it arrives, like file_hash hashes a stored file.
+class SpooledUpload:
+    def __init__(
+        self,
+        filename: str,
+        directory: str,
+        block_bytes: int,
+        spool_bytes: int,
+        max_bytes: int,
+    ):
+        self.filename = filename
+        self.directory = directory
+        self.block_bytes = max(1, block_bytes)
+        self.spool_bytes = spool_bytes
+        self.max_bytes = max_bytes
+        self.buffer = bytearray()
+        self.file = None
+        self.size = 0
+        self.digest = hashlib.blake2b(digest_size=16)
+
+    async def write(self, data: bytes) -> None:
+        self.size += len(data)
+        if self.max_bytes and self.size > self.max_bytes:
+            raise ValueError(f"{self.filename} is larger than {self.max_bytes} bytes")
+        self.digest.update(data)
+        self.buffer += data
+        if self.file is None and len(self.buffer) <= self.spool_bytes:
+            return None
+        if self.file is None:
+            self.file = await run_in_executor(
+                io_executor,
+                tempfile.NamedTemporaryFile,
+                dir=self.directory,
+                suffix=".part",
+                delete=False,
+            )
+        while len(self.buffer) >= self.block_bytes:
+            block = bytes(self.buffer[: self.block_bytes])
+            del self.buffer[: self.block_bytes]
+            await run_in_executor(io_executor, self.file.write, block)
+        return None
+
+    def save(self) -> str:
+        extension = os.path.splitext(self.filename)[1].lower()
+        path = os.path.join(self.directory, f"{uuid.uuid4().hex}{extension}")
+        if self.file is None:
+            with open(path, "wb") as file:
+                file.write(self.buffer)
+        else:
+            self.file.write(self.buffer)
+            self.file.close()
+            os.replace(self.file.name, path)
+        self.buffer = bytearray()
+        return path
+
+    # Path of the complete upload
+    async def finish(self) -> str:
+        return await run_in_executor(io_executor, self.save)
+
+    def discard(self) -> None:
+        if self.file is not None:
+            self.file.close()
+            os.remove(self.file.name)
+        self.buffer = bytearray()
+        return None
+
+
+# Stream a multipart/form-data body without buffering it: the body is fed to
+# the multipart parser as it arrives, file parts are spooled to disk, and
+# each file is yielded as (field name, filename, path, content hash) as soon
+# as its part ends, while the next one is still arriving. Plain fields are kept in
+# `fields`.
+class MultipartUploads:
+    def __init__(self, request, directory: str = None):
+        self.request = request
+        self.directory = directory or settings.upload_dir
+        self.fields = {}
+        self.events = []
+        self.name = None
+
+    def callbacks(self) -> dict:
+        def event(name):
+            return lambda *args: self.events.append((name, args))
+
+        return {
+            name: event(name)
+            for name in (
+                "on_part_begin",
+                "on_header_field",
+                "on_header_value",
+                "on_header_end",
+                "on_headers_finished",
+                "on_part_data",
+                "on_part_end",
+            )
+        }
+
+    # Spooled upload of a file part, None for a plain field
+    def open_part(self, headers: dict):
+        _, disposition = parse_options_header(headers.get(b"content-disposition", b""))
+        self.name = disposition.get(b"name", b"").decode()
+        filename = disposition.get(b"filename")
+        if filename is None:
+            return None
+        return SpooledUpload(
+            os.path.basename(filename.decode()),
+            self.directory,
+            settings.upload_block_bytes,
+            settings.upload_spool_bytes,
+            settings.upload_max_bytes,
+        )
+
+    async def files(self):
+        content_type, options = parse_options_header(
+            self.request.headers.get("content-type", "")
+        )
+        if content_type != b"multipart/form-data" or b"boundary" not in options:
+            raise ValueError("Expected a multipart/form-data body")
+        await run_in_executor(io_executor, os.makedirs, self.directory, exist_ok=True)
+        parser = MultipartParser(options[b"boundary"], self.callbacks())
+        upload = None
+        try:
+            async for body in self.request.stream():
+                parser.write(body)
+                events, self.events = self.events, []
+                for event, args in events:
+                    data = args[0][args[1] : args[2]] if args else b""
+                    if event == "on_part_begin":
+                        headers, field, value, text = {}, b"", b"", bytearray()
+                    elif event == "on_header_field":
+                        field += data
+                    elif event == "on_header_value":
+                        value += data
+                    elif event == "on_header_end":
+                        headers[field.lower()] = value
+                        field, value = b"", b""
+                    elif event == "on_headers_finished":
+                        upload = self.open_part(headers)
+                    elif event == "on_part_data" and upload is not None:
+                        await upload.write(data)
+                    elif event == "on_part_data":
+                        text += data
+                    elif event == "on_part_end" and upload is not None:
+                        path = await upload.finish()
+                        filename, content_hash = upload.filename, upload.digest
+                        upload = None
+                        yield self.name, filename, path, content_hash.hexdigest()
+                    elif event == "on_part_end":
+                        self.fields[self.name] = text.decode()
+            parser.finalize()
+        finally:
+            if upload is not None:
+                await run_in_executor(io_executor, upload.discard)
@@ -0,0 +1,430 @@
+import threading
+import numpy as np
+from bson import ObjectId
+from config.settings import settings
+from models.segment_store import SegmentStore
+from models.embedding_codec import decode_embedding, raw_collection
+from models.ann_index import IVFIndex
+from models.quantization import QuantizedCodes, ScalarQuantizer, ProductQuantizer
+from models.search_filter import (
+    METADATA_DTYPE,
+    BlockMetadata,
+    SearchFilter,
+    make_metadata,
+    remap_sources,
+    source_name,
+)
+
+# Dimension of the all-MiniLM-L6-v2 sentence embeddings
+EMBEDDING_DIM = 384
+
+
+# Vector index over the Upload_Docs embeddings. The rows live either in a
+# resident, growable matrix or, when a segment directory is configured, in
+# memory-mapped segments shared with the other worker processes.
+class VectorIndex:
+    def __init__(
+        self,
+        dim: int = EMBEDDING_DIM,
+        segment_store=None,
+        ann_index=None,
+        quantized_codes=None,
+    ):
+        self.dim = dim
+        self.segment_store = segment_store
+        self.ann_index = ann_index
+        self.quantized_codes = quantized_codes
+        self.lock = threading.Lock()
+        self.matrix = np.empty((0, dim), dtype=np.float32)
+        self.ids = np.empty(0, dtype="V12")
+        self.records = np.empty(0, dtype=METADATA_DTYPE)
+        self.sources, self.source_codes = [], {}
+        self.resident_metadata = None
+        self.size = 0
+        self.segments = {}
+        self.manifest_stamp = None
+        # Ids of removed chunks, masked out when blocks are scored
+        self.tombstones = set()
+        self.tombstone_version = 0
+        self.tombstone_stamp = None
+        self.dead_rows = {}
+        self.loaded = False
+
+    # L2-normalize the embeddings so that a dot product is the cosine similarity
+    def normalize(self, embeddings) -> np.ndarray:
+        vectors = np.asarray(embeddings, dtype=np.float32).reshape(-1, self.dim)
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    # Grow the contiguous buffers geometrically so appends stay amortized O(1)
+    def reserve(self, capacity: int) -> None:
+        if capacity <= len(self.matrix):
+            return None
+        capacity = max(capacity, 2 * len(self.matrix), 1024)
+        matrix = np.empty((capacity, self.dim), dtype=np.float32)
+        matrix[: self.size] = self.matrix[: self.size]
+        ids = np.empty(capacity, dtype="V12")
+        ids[: self.size] = self.ids[: self.size]
+        records = np.empty(capacity, dtype=METADATA_DTYPE)
+        records[: self.size] = self.records[: self.size]
+        self.matrix, self.ids, self.records = matrix, ids, records
+        return None
+
+    # Append the newly inserted chunks to the index, with the source and status
+    # of each chunk used by search filters
+    def add(self, ids: list, embeddings, sources=None, statuses=None) -> None:
+        if not len(ids):
+            return None
+        vectors = self.normalize(embeddings)
+        binary_ids = np.array([ObjectId(doc_id).binary for doc_id in ids], "V12")
+        metadata = make_metadata(binary_ids, sources, statuses)
+        if self.segment_store is not None:
+            self.segment_store.append(binary_ids, vectors, metadata)
+            self.refresh()
+            return None
+        with self.lock:
+            records = remap_sources(metadata, self.sources, self.source_codes)
+            self.reserve(self.size + len(ids))
+            end = self.size + len(ids)
+            self.matrix[self.size : end] = vectors
+            self.ids[self.size : end] = binary_ids
+            self.records[self.size : end] = records
+            self.size = end
+            self.resident_metadata = None
+        return None
+
+    # Remove chunks from search results. Their rows stay in place and are
+    # masked out when a block is scored; with a segment store the tombstones
+    # are shared with the other worker processes.
+    def remove(self, ids: list) -> None:
+        binary_ids = {ObjectId(doc_id).binary for doc_id in ids}
+        if not binary_ids:
+            return None
+        if self.segment_store is not None:
+            self.segment_store.append_tombstones(binary_ids)
+            self.refresh()
+            return None
+        with self.lock:
+            self.tombstones |= binary_ids
+            self.tombstone_version += 1
+        return None
+
+    # Rows of a block whose chunks were removed, cached per tombstone version
+    def block_dead_rows(self, key, ids: np.ndarray) -> np.ndarray:
+        with self.lock:
+            tombstones, version = self.tombstones, self.tombstone_version
+            cached = self.dead_rows.get(key)
+        if not tombstones:
+            return np.empty(0, dtype=np.int64)
+        if cached is not None and cached[:2] == (version, len(ids)):
+            return cached[2]
+        removed = np.array(list(tombstones), dtype="S12")
+        rows = np.flatnonzero(np.isin(np.ascontiguousarray(ids).view("S12"), removed))
+        with self.lock:
+            self.dead_rows[key] = (version, len(ids), rows)
+        return rows
+
+    def refresh_tombstones(self) -> None:
+        stamp = self.segment_store.tombstones_stamp()
+        if stamp == self.tombstone_stamp:
+            return None
+        tombstones = self.segment_store.read_tombstones()
+        with self.lock:
+            self.tombstones = tombstones
+            self.tombstone_version += 1
+            self.tombstone_stamp = stamp
+        return None
+
+    # Map the segments published since the last call; cheap when nothing changed
+    def refresh(self) -> None:
+        if self.segment_store is None:
+            return None
+        self.refresh_tombstones()
+        stamp = self.segment_store.manifest_stamp()
+        if stamp == self.manifest_stamp:
+            return None
+        for attempt in range(3):
+            manifest = self.segment_store.read_manifest()
+            try:
+                segments = {}
+                for segment in manifest:
+                    segments[segment["name"]] = self.segments.get(segment["name"])
+                    if segments[segment["name"]] is None:
+                        ids, vectors, metadata = self.segment_store.open_segment(
+                            segment
+                        )
+                        segments[segment["name"]] = (
+                            ids,
+                            vectors,
+                            BlockMetadata(*metadata),
+                        )
+                break
+            except FileNotFoundError:
+                # A compaction replaced the manifest while it was being read
+                if attempt == 2:
+                    raise
+        with self.lock:
+            self.segments = segments
+            self.manifest_stamp = stamp
+        return None
+
+    # Stream the stored embeddings out of MongoDB in batches, with the source
+    # and status of every chunk. Documents are read as raw BSON so a Binary
+    # embedding becomes an array without decoding each element.
+    def load_batches(self, docs_collection, batch_size: int):
+        batch = ([], [], [], [])
+        cursor = raw_collection(docs_collection).find(
+            {"status": {"$ne": 0}},
+            {"embedding": 1, "source": 1, "url": 1, "status": 1},
+            batch_size=batch_size,
+        )
+        for doc in cursor:
+            embedding = doc.get("embedding")
+            if embedding is None or not len(embedding):
+                continue
+            batch[0].append(doc["_id"])
+            batch[1].append(decode_embedding(embedding))
+            batch[2].append(source_name(doc.get("source"), doc.get("url")))
+            batch[3].append(doc.get("status"))
+            if len(batch[0]) >= batch_size:
+                yield batch
+                batch = ([], [], [], [])
+        if batch[0]:
+            yield batch
+
+    # Build the index once: map the existing segments, or scan MongoDB if there
+    # are none yet. Only one worker bootstraps the segments; the others wait on
+    # the store lock and then map what it wrote.
+    def load_from_mongodb(self, docs_collection, batch_size: int = 1000) -> None:
+        if self.segment_store is not None:
+            with self.segment_store.lock():
+                if not self.segment_store.read_manifest():
+                    segments = []
+                    for ids, embeddings, sources, statuses in self.load_batches(
+                        docs_collection, settings.vector_segment_rows
+                    ):
+                        binary_ids = np.array(
+                            [ObjectId(doc_id).binary for doc_id in ids], "V12"
+                        )
+                        segments.append(
+                            self.segment_store.write_segment(
+                                binary_ids,
+                                self.normalize(embeddings),
+                                make_metadata(binary_ids, sources, statuses),
+                            )
+                        )
+                    self.segment_store.write_manifest(segments)
+            self.refresh()
+            self.train_ann_index()
+            self.train_quantized_codes()
+            self.loaded = True
+            return None
+
+        with self.lock:
+            self.matrix = np.empty((0, self.dim), dtype=np.float32)
+            self.ids = np.empty(0, dtype="V12")
+            self.records = np.empty(0, dtype=METADATA_DTYPE)
+            self.sources, self.source_codes = [], {}
+            self.resident_metadata = None
+            self.size = 0
+            self.reserve(docs_collection.estimated_document_count())
+        for ids, embeddings, sources, statuses in self.load_batches(
+            docs_collection, batch_size
+        ):
+            self.add(ids, embeddings, sources, statuses)
+        self.train_ann_index()
+        self.train_quantized_codes()
+        self.loaded = True
+        return None
+
+    # Snapshot the (key, ids, vectors, metadata) blocks to score without
+    # holding the lock
+    def blocks(self) -> list:
+        self.refresh()
+        with self.lock:
+            blocks = [
+                (name, ids, vectors, metadata)
+                for name, (ids, vectors, metadata) in self.segments.items()
+            ]
+            if self.size:
+                if self.resident_metadata is None:
+                    self.resident_metadata = BlockMetadata(
+                        list(self.sources), self.records[: self.size]
+                    )
+                blocks.append(
+                    (
+                        "resident",
+                        self.ids[: self.size],
+                        self.matrix[: self.size],
+                        self.resident_metadata,
+                    )
+                )
+        return blocks
+
+    # Train the IVF coarse quantizer once the corpus is large enough for it
+    def train_ann_index(self, blocks: list = None) -> bool:
+        if self.ann_index is None:
+            return False
+        blocks = self.blocks() if blocks is None else blocks
+        if sum(len(ids) for _, ids, _, _ in blocks) < settings.ivf_min_rows:
+            return False
+        if not self.ann_index.trained:
+            self.ann_index.train(blocks)
+        return True
+
+    # Train the compressed codes once the corpus is large enough for them
+    def train_quantized_codes(self, blocks: list = None) -> bool:
+        if self.quantized_codes is None:
+            return False
+        blocks = self.blocks() if blocks is None else blocks
+        if sum(len(ids) for _, ids, _, _ in blocks) < settings.quantization_min_rows:
+            return False
+        if not self.quantized_codes.trained:
+            self.quantized_codes.train(blocks)
+        return True
+
+    # Top-k candidates of every block. A search filter first narrows a block
+    # to its allowed rows, so filtered-out rows are never scored. The rows
+    # scored are then all allowed rows, or those in the probed IVF cells; with
+    # quantization their codes are scored first and only a shortlist is
+    # re-scored with the full-precision rows. Each block costs one matmul plus
+    # argpartition.
+    def search_blocks(
+        self,
+        blocks: list,
+        query: np.ndarray,
+        top_k: int,
+        nprobe=None,
+        search_filter: SearchFilter = None,
+    ):
+        use_ann_index = self.train_ann_index(blocks)
+        use_codes = self.train_quantized_codes(blocks)
+        cells = self.ann_index.probe(query, nprobe) if use_ann_index else None
+        rerank_size = max(top_k, settings.quantization_rerank_size)
+
+        candidate_ids, candidate_scores = [], []
+        for key, ids, vectors, metadata in blocks:
+            rows = None
+            if search_filter is not None and not search_filter.is_empty:
+                rows = metadata.allowed_rows(search_filter)
+                if rows is not None and not len(rows):
+                    continue
+            # Few enough allowed rows are scored exactly, skipping the IVF
+            # cells that would mostly miss them
+            narrow = rows is not None and len(rows) <= settings.filter_exact_rows
+            if use_ann_index and not narrow:
+                cell_rows = self.ann_index.candidate_rows(key, vectors, cells)
+                rows = (
+                    cell_rows
+                    if rows is None
+                    else np.intersect1d(cell_rows, rows, assume_unique=True)
+                )
+            if use_codes and not narrow:
+                rows = self.quantized_codes.shortlist(
+                    key, vectors, query, rows, rerank_size
+                )
+            if rows is None:
+                rows = np.arange(len(ids))
+                scores = vectors @ query
+            else:
+                scores = vectors[rows] @ query
+            if not len(rows):
+                continue
+            dead = self.block_dead_rows(key, ids)
+            if len(dead):
+                scores[np.isin(rows, dead, assume_unique=True)] = -np.inf
+            if top_k < len(scores):
+                best = np.argpartition(scores, -top_k)[-top_k:]
+                rows, scores = rows[best], scores[best]
+            live = np.isfinite(scores)
+            candidate_ids.append(ids[rows[live]])
+            candidate_scores.append(scores[live])
+
+        live_keys = {key for key, _, _, _ in blocks}
+        if use_ann_index:
+            self.ann_index.forget(live_keys)
+        if use_codes:
+            self.quantized_codes.forget(live_keys)
+        return candidate_ids, candidate_scores
+
+    # Search every block and merge the per-block winners into the top-k
+    def search(
+        self,
+        query_embedding,
+        top_k: int = 10,
+        threshold: float = 0.5,
+        nprobe=None,
+        search_filter: SearchFilter = None,
+    ) -> list:
+        if top_k <= 0:
+            return []
+        query = self.normalize(query_embedding)[0]
+        candidate_ids, candidate_scores = self.search_blocks(
+            self.blocks(), query, top_k, nprobe=nprobe, search_filter=search_filter
+        )
+        if not candidate_ids:
+            return []
+
+        ids = np.concatenate(candidate_ids)
+        scores = np.concatenate(candidate_scores)
+        order = np.argsort(scores)[::-1][:top_k]
+        return [
+            (ObjectId(ids[i].tobytes()), float(scores[i]))
+            for i in order
+            if scores[i] >= threshold
+        ]
+
+    # Fetch the text and embedding of the winning chunks as (id, text,
+    # embedding), preserving the ranking order
+    async def fetch_chunks(self, docs_collection, ids: list) -> list:
+        if not ids:
+            return []
+        cursor = docs_collection.find(
+            {"_id": {"$in": ids}, "status": {"$ne": 0}}, {"text": 1, "embedding": 1}
+        )
+        docs = {doc["_id"]: doc async for doc in cursor}
+        return [
+            (doc_id, docs[doc_id]["text"], decode_embedding(docs[doc_id]["embedding"]))
+            for doc_id in ids
+            if doc_id in docs
+        ]
+
+
+vector_index = VectorIndex(
+    segment_store=(
+        SegmentStore(
+            settings.vector_segment_dir,
+            EMBEDDING_DIM,
+            max_segments=settings.vector_max_segments,
+            merge_factor=settings.vector_merge_factor,
+        )
+        if settings.vector_segment_dir
+        else None
+    ),
+    ann_index=(
+        IVFIndex(
+            nlist=settings.ivf_nlist,
+            nprobe=settings.ivf_nprobe,
+            train_size=settings.ivf_train_size,
+            iterations=settings.ivf_iterations,
+        )
+        if settings.vector_search_mode == "ivf"
+        else None
+    ),
+    quantized_codes=(
+        QuantizedCodes(
+            (
+                ProductQuantizer(
+                    subspaces=settings.pq_subspaces,
+                    iterations=settings.quantization_iterations,
+                )
+                if settings.vector_quantization == "pq"
+                else ScalarQuantizer()
+            ),
+            train_size=settings.quantization_train_size,
+        )
+        if settings.vector_quantization in ("int8", "pq")
+        else None
+    ),
+)
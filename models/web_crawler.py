@@ -0,0 +1,175 @@
+import asyncio
+import time
+from collections import deque
+from urllib.parse import urldefrag, urljoin, urlparse
+import aiohttp
+from bs4 import BeautifulSoup
+from config.metrics import metrics
+from config.settings import settings
+from config.executors import cpu_executor, run_in_executor
+
+HEADERS = {
+    "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3"
+}
+
+
+# Whitespace-normalized text of a page and the absolute urls of its links
+def parse_html(html: str, base_url: str) -> tuple:
+    soup = BeautifulSoup(html, "html.parser")
+    links = [urljoin(base_url, link["href"]) for link in soup.find_all("a", href=True)]
+    return " ".join(soup.get_text().split()), links
+
+
+# Crawls websites over one pooled HTTP client shared by every ingestion job.
+# Connections are kept alive and reused, requests to a host are capped at
+# `per_host` at a time (waiting for a slot does not count against the
+# timeout), and pages are fetched ahead concurrently but handed out in link
+# order, so a crawl that is resumed sees its chunks in the same order.
+class WebCrawler:
+    def __init__(
+        self,
+        connections: int,
+        per_host: int,
+        pages_in_flight: int,
+        timeout_seconds: float,
+        connect_timeout_seconds: float,
+        max_page_bytes: int,
+        max_urls: int,
+    ):
+        self.connections = connections
+        self.per_host = per_host
+        self.pages_in_flight = max(1, pages_in_flight)
+        self.timeout = aiohttp.ClientTimeout(
+            total=timeout_seconds, sock_connect=connect_timeout_seconds
+        )
+        self.max_page_bytes = max_page_bytes
+        self.max_urls = max_urls
+        self.client = None
+        self.hosts = {}
+
+    # The pooled client, created on first use on the serving event loop
+    def session(self) -> aiohttp.ClientSession:
+        if self.client is None or self.client.closed:
+            self.client = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=self.connections,
+                    limit_per_host=self.per_host,
+                    ttl_dns_cache=300,
+                ),
+                headers=HEADERS,
+                timeout=self.timeout,
+            )
+        return self.client
+
+    def host_slots(self, url: str) -> asyncio.Semaphore:
+        host = urlparse(url).netloc
+        if host not in self.hosts:
+            self.hosts[host] = asyncio.Semaphore(self.per_host)
+        return self.hosts[host]
+
+    # Html of a page, read in blocks and cut off at max_page_bytes
+    async def fetch(self, url: str) -> str:
+        async with self.host_slots(url):
+            started = time.perf_counter()
+            async with self.session().get(url, allow_redirects=True) as response:
+                response.raise_for_status()
+                body = bytearray()
+                async for block in response.content.iter_chunked(1 << 16):
+                    body += block
+                    if len(body) >= self.max_page_bytes:
+                        break
+                html = bytes(body[: self.max_page_bytes]).decode(
+                    response.get_encoding() or "utf-8", errors="replace"
+                )
+            metrics.observe("crawl_fetch_ms", (time.perf_counter() - started) * 1000)
+            metrics.increment("crawl_pages")
+        return html
+
+    async def page(self, url: str) -> tuple:
+        html = await self.fetch(url)
+        return await run_in_executor(cpu_executor, parse_html, html, url)
+
+    # Page urls of a website: the landing page's links under the website url,
+    # in link order without duplicates. Sites with max_urls links or more are
+    # refused.
+    async def website_urls(self, url: str) -> list:
+        _, links = await self.page(url)
+        links = list(dict.fromkeys(urldefrag(link)[0] for link in links))
+        if len(links) >= self.max_urls:
+            raise ValueError(
+                f"This website having more than {self.max_urls} URLs to scrape"
+            )
+        return [link for link in links if link.startswith(url)]
+
+    # (url, text) of every page, the website's pages when follow_links is set
+    # or the single page otherwise. At most pages_in_flight pages are fetched
+    # ahead; a page that fails is skipped and counted.
+    async def crawl(self, url: str, follow_links: bool = True):
+        urls = await self.website_urls(url) if follow_links else [url]
+        pending, pages = iter(urls), deque()
+        try:
+            for page_url in pending:
+                pages.append((page_url, asyncio.ensure_future(self.page(page_url))))
+                if len(pages) < self.pages_in_flight:
+                    continue
+                page = await self.next_page(pages, follow_links)
+                if page is not None:
+                    yield page
+            while pages:
+                page = await self.next_page(pages, follow_links)
+                if page is not None:
+                    yield page
+        finally:
+            for _, task in pages:
+                task.cancel()
+
+    async def next_page(self, pages: deque, follow_links: bool):
+        page_url, task = pages.popleft()
+        try:
+            text, _ = await task
+        except (aiohttp.ClientError, asyncio.TimeoutError, UnicodeError):
+            if not follow_links:
+                raise
+            metrics.increment("crawl_page_errors")
+            return None
+        return page_url, text
+
+    # Blocking iterator over crawl() for the ingestion pipeline's parse
+    # executor; each page is awaited on the event loop `loop`
+    def iter_pages(self, url: str, loop, follow_links: bool = True):
+        pages = self.crawl(url, follow_links)
+        try:
+            while True:
+                page = asyncio.run_coroutine_threadsafe(
+                    self.next_crawled(pages), loop
+                ).result()
+                if page is None:
+                    return
+                yield page
+        finally:
+            if not loop.is_closed():
+                asyncio.run_coroutine_threadsafe(self.stop_crawl(pages), loop).result()
+
+    async def next_crawled(self, pages):
+        return await anext(pages, None)
+
+    async def stop_crawl(self, pages) -> None:
+        await pages.aclose()
+        return None
+
+    async def close(self) -> None:
+        if self.client is not None:
+            await self.client.close()
+        self.client = None
+        return None
+
+
+web_crawler = WebCrawler(
+    settings.crawl_connections,
+    settings.crawl_per_host,
+    settings.crawl_pages_in_flight,
+    settings.crawl_timeout_seconds,
+    settings.crawl_connect_timeout_seconds,
+    settings.crawl_max_page_bytes,
+    settings.crawl_max_urls,
+)
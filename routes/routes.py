@@ -1,8 +1,13 @@
 # Path: routes/routes.py
+import os
 from fastapi import APIRouter, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+from config.metrics import metrics
+from models.embedding_models import embedding_models
+from config.executors import io_executor, run_in_executor
+from models.ingestion_jobs import ingestion_jobs
 from models.read_upload_file import TextProcessor
-from models.scrapping import WebScraper
+from models.uploads import MultipartUploads
 from models.openai_model import OpenAI_Model
 from models.gemini_model import Gemini_Model
 from models.llama_model import Llama_Model
@@ -11,27 +16,82 @@ from models.llama_model import Llama_Model
 router = APIRouter()
 
 
-# Endpoint to upload files
+# Endpoint to upload files; each file is ingested by a background job. Files
+# are streamed to disk part by part and queued as soon as each one arrives.
+# A file_path form field still names a file already on the server. Uploads
+# are sourced by their content hash, so uploading the same file again stores
+# nothing, unless a source_id field sent before a file names the source it
+# updates.
 @router.post("/read_upload_file")
 async def read_file_and_extract_text(request: Request):
-    data = await request.form()
-    file_path = data["file_path"]
     try:
-        return TextProcessor(file_path).read_file_and_store_embeddings()
+        jobs = []
+        if request.headers.get("content-type", "").startswith("multipart/form-data"):
+            uploads = MultipartUploads(request)
+            async for _, filename, path, content_hash in uploads.files():
+                if TextProcessor(path).file_format() is None:
+                    await run_in_executor(io_executor, os.remove, path)
+                    jobs.append(
+                        {
+                            "filename": filename,
+                            "message": "File format not supported. Please upload pdf, docx or txt file.",
+                        }
+                    )
+                    continue
+                source_id = "upload:" + (
+                    uploads.fields.pop("source_id", None) or content_hash
+                )
+                job_id = await ingestion_jobs.submit(
+                    "upload", path, name=filename, source_id=source_id
+                )
+                jobs.append(
+                    {"filename": filename, "source": source_id, "job_id": job_id}
+                )
+            file_path = uploads.fields.get("file_path")
+        else:
+            file_path = (await request.form()).get("file_path")
+        if file_path:
+            job_id = await ingestion_jobs.submit("file", file_path)
+            jobs.append({"filename": file_path, "job_id": job_id})
+        if not jobs:
+            return JSONResponse(
+                content={"message": "No file uploaded."}, status_code=400
+            )
+        content = {"message": "Files queued for ingestion.", "jobs": jobs}
+        if len(jobs) == 1 and "job_id" in jobs[0]:
+            content["job_id"] = jobs[0]["job_id"]
+        return JSONResponse(content=content, status_code=202)
     except Exception as e:
         return JSONResponse(
             content={"message": "API Error", "Error": str(e)}, status_code=200
         )
 
 
-# Endpoint to web scrapping
+# Endpoint to web scrapping; the website is ingested by a background job
 @router.post("/web_scraping")
 async def web_scrapping(request: Request):
     data = await request.json()
     url = data["url"]
     try:
-        web_scraper_obj = WebScraper(url)
-        return web_scraper_obj.extracted_text_and_stored()
+        job_id = await ingestion_jobs.submit("website", url)
+        return JSONResponse(
+            content={"message": "Website queued for scraping.", "job_id": job_id},
+            status_code=202,
+        )
+    except Exception as e:
+        return JSONResponse(
+            content={"message": "API Error", "Error": str(e)}, status_code=200
+        )
+
+
+# Endpoint to report the progress of an ingestion job
+@router.get("/jobs/{job_id}")
+async def ingestion_job_status(job_id: str):
+    try:
+        job = await ingestion_jobs.get(job_id)
+        if job is None:
+            return JSONResponse(content={"message": "Job not found"}, status_code=404)
+        return JSONResponse(content=job, status_code=200)
     except Exception as e:
         return JSONResponse(
             content={"message": "API Error", "Error": str(e)}, status_code=200
@@ -46,13 +106,13 @@ async def response_of_user_query(request: Request):
     try:
         if ai_model == "openai":
             OpenAI_Model_obj = OpenAI_Model(data=data)
-            return OpenAI_Model_obj.response_to_user_from_oepnai_model()
+            return await OpenAI_Model_obj.response_to_user_from_oepnai_model()
         elif ai_model == "gemini":
             Gemini_Model_obj = Gemini_Model(data=data)
-            return Gemini_Model_obj.response_to_user_from_gemini_model()
+            return await Gemini_Model_obj.response_to_user_from_gemini_model()
         elif ai_model == "llama":
             Llama_Model_obj = Llama_Model(data=data)
-            return Llama_Model_obj.response_to_user_from_llama_model()
+            return await Llama_Model_obj.response_to_user_from_llama_model()
         else:
             return JSONResponse(
                 content={"message": "Invalid model type"}, status_code=400
@@ -61,4 +121,44 @@ async def response_of_user_query(request: Request):
         return JSONResponse(
             content={"message": "API Error", "Error": str(e)}, status_code=200
         )
- 
\ No newline at end of file
+
+
+# Endpoint to stream the response of user query as server-sent events
+@router.post("/query_response/stream")
+async def stream_response_of_user_query(request: Request):
+    data = await request.json()
+    ai_model = data["ai_model"]
+    try:
+        if ai_model == "openai":
+            model_obj = OpenAI_Model(data=data)
+        elif ai_model == "gemini":
+            model_obj = Gemini_Model(data=data)
+        elif ai_model == "llama":
+            model_obj = Llama_Model(data=data)
+        else:
+            return JSONResponse(
+                content={"message": "Invalid model type"}, status_code=400
+            )
+        return StreamingResponse(
+            model_obj.stream_response_to_user(),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    except Exception as e:
+        return JSONResponse(
+            content={"message": "API Error", "Error": str(e)}, status_code=200
+        )
+
+
+# Endpoint to report the process metrics
+@router.get("/metrics")
+async def report_metrics():
+    return JSONResponse(content=metrics.snapshot(), status_code=200)
+
+
+# Endpoint to report whether the embedding model is loaded
+@router.get("/ready")
+async def readiness():
+    if embedding_models.ready:
+        return JSONResponse(content={"ready": True}, status_code=200)
+    return JSONResponse(content={"ready": False}, status_code=503)
@@ -11,8 +11,6 @@ list_of_files = [
     "models/__init__.py",
     "models/read_upload_file.py",
     "models/scrapping.py",
-    "models/web_scrapping.py",
-    "models/webpage_scrapping.py",
     "models/openai_model.py",
     "models/gemini_model.py",
     "models/llama_model.py",